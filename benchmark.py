@@ -0,0 +1,89 @@
+"""
+This file is a script that compares the firewall implementations. For each
+firewall, it measures the time to add the rules of a CSV file, the memory used
+to store the rules, and the time to decide whether to accept random packets.
+
+This script can be run in the terminal using this command:
+    python3 benchmark.py [CSV file path] [number of packets] [firewall names]
+
+The firewall names are the names of the engines registered in `engine.py`.
+All firewalls except the naive and layered firewalls are compared when no
+names are provided, because the naive firewall checks every rule for every
+packet, and the layered firewall reads the CSV file into an overlay which is
+meant for a small number of rules. The firewalls which can't store all the
+rules of the CSV file only read the first `max_fw_rules` rules.
+"""
+
+
+import random
+import sys
+import time
+import tracemalloc
+from typing import List, Tuple
+
+from engine import ENGINES, get_engine
+from rand_fields import (
+    get_rand_direction, get_rand_ip_address_value, get_rand_port_value,
+    get_rand_protocol
+)
+
+
+def get_rand_packets(num_packets: int) -> List[Tuple[str, str, int, str]]:
+    """Return a list of random packets."""
+    return [
+        (
+            get_rand_direction(), get_rand_protocol(),
+            int(get_rand_port_value()), get_rand_ip_address_value()
+        )
+        for i in range(num_packets)
+    ]
+
+
+def benchmark(
+    name: str, firewall_class: type, csv_file_path: str, num_packets: int
+) -> None:
+    """
+    Print the time duration to add rules, the memory used by the rules, and
+    the time duration to accept random packets of the provided firewall
+    class.
+
+    The same random packets are generated for each firewall class. They are
+    generated after the memory is measured, because objects created before
+    `tracemalloc` was started make the compiled firewall much slower to
+    accept packets afterwards.
+    """
+    max_fw_rules = firewall_class.max_fw_rules
+    if max_fw_rules is not None:
+        print(f"{name} only reads the first {max_fw_rules} rules")
+    tracemalloc.start()
+    start_time = time.time()
+    if max_fw_rules is None:
+        fw = firewall_class(csv_file_path)
+    else:
+        fw = firewall_class()
+        fw.load_csv(csv_file_path, max_fw_rules)
+    end_time = time.time()
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name} time duration to add rules: {end_time - start_time}")
+    print(f"{name} memory used by rules (MB): {memory / 2 ** 20}")
+
+    random.seed(0)
+    packets = get_rand_packets(num_packets)
+    start_time = time.time()
+    fw.accept_packets(packets)
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"{name} time duration to accept packets: {duration}")
+    fw.close()
+
+
+if __name__ == "__main__":
+    csv_file_path = sys.argv[1] if len(sys.argv) > 1 else "500k_rules.csv"
+    num_packets = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    names = sys.argv[3:] if len(sys.argv) > 3 else [
+        name for name in ENGINES
+        if name not in ("layered_firewall", "naive_firewall")
+    ]
+    for name in names:
+        benchmark(name, get_engine(name), csv_file_path, num_packets)
@@ -0,0 +1,222 @@
+"""
+This file implements a firewall which stores firewall rules as bit-vectors of
+elementary port and IP address intervals.
+
+This program can be run in the terminal using this command:
+    python3 bitvector_firewall.py
+
+The memory of the bitsets grows with the square of the number of firewall
+rules, so the program only reads the first `MAX_FW_RULES` rules of
+`500k_rules.csv`.
+"""
+
+
+import time
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+
+from engine import FirewallEngine
+from firewall_rule import FirewallRule
+from ip_address import IPAddress
+
+
+# the max number of firewall rules of a generated CSV file which fit in
+# memory, which is about 20MB for 10000 rules of `500k_rules.csv`
+MAX_FW_RULES = 10000
+
+
+def build_bitsets(
+    ranges: List[Tuple[int, int]]
+) -> Tuple[List[int], List[int]]:
+    """
+    Split the values covered by the provided ranges into elementary intervals.
+    Return a tuple of: the sorted start value of each interval, and the
+    bitset of each interval. Bit N of a bitset is set when the interval is
+    covered by range N.
+    """
+    # a range toggles its bit on at its min value and off after its max value
+    toggles = {0: 0}
+    for range_num, (min_value, max_value) in enumerate(ranges):
+        bit = 1 << range_num
+        toggles[min_value] = toggles.get(min_value, 0) ^ bit
+        toggles[max_value + 1] = toggles.get(max_value + 1, 0) ^ bit
+
+    points = sorted(toggles)
+    bitsets = []
+    bitset = 0
+    for point in points:
+        bitset ^= toggles[point]
+        bitsets.append(bitset)
+    return points, bitsets
+
+
+class BitVectorIndex(object):
+    """
+    A data structure to store the firewall rules of one direction and
+    protocol combination.
+
+    Each firewall rule has a rule ID, which is its position in a list of
+    firewall rules. The port values are split into elementary intervals at
+    the min port and after the max port of every firewall rule. Each interval
+    has a bitset, stored as a Python integer, whose bit N is set when rule N
+    covers the interval. The IP addresses are split into intervals in the
+    same way.
+
+    The intervals and bitsets are built once, the first time a packet is
+    checked after firewall rules are added or removed.
+    """
+
+    def __init__(self):
+        """Constructs an empty index."""
+        self.fw_rules = []
+        self.fw_rule_ids = {}
+        self.is_built = True
+        self.port_points = [0]
+        self.port_bitsets = [0]
+        self.ip_points = [0]
+        self.ip_bitsets = [0]
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the index."""
+        if fw_rule in self.fw_rule_ids:
+            return
+        self.fw_rule_ids[fw_rule] = len(self.fw_rules)
+        self.fw_rules.append(fw_rule)
+        self.is_built = False
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Remove the provided firewall rule from the index."""
+        rule_id = self.fw_rule_ids.pop(fw_rule, None)
+        if rule_id is None:
+            return
+        self.fw_rules[rule_id] = None
+        self.is_built = False
+
+    def build(self) -> None:
+        """
+        Build the intervals and bitsets. Removed firewall rules are dropped
+        from the list of firewall rules, so the remaining firewall rules may
+        get new rule IDs.
+        """
+        self.fw_rules = [
+            fw_rule for fw_rule in self.fw_rules if fw_rule is not None
+        ]
+        self.fw_rule_ids = {
+            fw_rule: rule_id for rule_id, fw_rule in enumerate(self.fw_rules)
+        }
+        self.port_points, self.port_bitsets = build_bitsets([
+            (fw_rule.min_port, fw_rule.max_port) for fw_rule in self.fw_rules
+        ])
+        self.ip_points, self.ip_bitsets = build_bitsets([
+            (fw_rule.min_ip.to_int(), fw_rule.max_ip.to_int())
+            for fw_rule in self.fw_rules
+        ])
+        self.is_built = True
+
+    def get_matches(self, port: int, ip: int) -> int:
+        """
+        Return the bitset of the firewall rules which match the provided port
+        value and IP address.
+        """
+        if not self.is_built:
+            self.build()
+        port_interval = bisect_right(self.port_points, port) - 1
+        ip_interval = bisect_right(self.ip_points, ip) - 1
+        return self.port_bitsets[port_interval] & self.ip_bitsets[ip_interval]
+
+
+class Firewall(FirewallEngine):
+    """
+    A data structure to represent a firewall. A firewall contains a list of
+    firewall rules.
+
+    There are four possible combinations of direction and protocol values.
+    Each combination stores its firewall rules in a `BitVectorIndex`.
+
+    Deciding to accept a packet finds the port interval and the IP address
+    interval of the packet with two binary searches, and intersects their
+    bitsets with a single AND. The packet is accepted when the intersection
+    is not zero. The lowest set bit of the intersection is the first added
+    firewall rule which matches the packet.
+
+    The bitsets use one bit per firewall rule for each of up to 2N intervals,
+    so the memory grows with the square of the number of firewall rules.
+    """
+
+    max_fw_rules = MAX_FW_RULES
+
+    def __init__(self, csv_file_path: Optional[str] = None):
+        """
+        Initialize the firewall by reading and storing the firewall rules of
+        the CSV file.
+        """
+        self.fw_rules = {
+            "inbound": {"tcp": BitVectorIndex(), "udp": BitVectorIndex()},
+            "outbound": {"tcp": BitVectorIndex(), "udp": BitVectorIndex()},
+        }
+
+        # read firewall rules from CSV file and add them to the data structure
+        super().__init__(csv_file_path)
+
+    def load_csv(
+        self, csv_file_path: str, max_fw_rules: Optional[int] = None
+    ) -> None:
+        """
+        Add the firewall rules of the CSV file, and build the bitsets of all
+        the indexes once.
+        """
+        super().load_csv(csv_file_path, max_fw_rules)
+        for protocols in self.fw_rules.values():
+            for index in protocols.values():
+                index.build()
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the data structure."""
+        self.fw_rules[fw_rule.direction][fw_rule.protocol].add_fw_rule(fw_rule)
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Remove the provided firewall rule from the data structure."""
+        index = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        index.remove_fw_rule(fw_rule)
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        ip = IPAddress(ip_address).to_int()
+        return self.fw_rules[direction][protocol].get_matches(port, ip) != 0
+
+    def get_first_match(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> Optional[FirewallRule]:
+        """
+        Return the first added firewall rule which matches the packet, or
+        `None` if no firewall rule matches the packet.
+        """
+        ip = IPAddress(ip_address).to_int()
+        index = self.fw_rules[direction][protocol]
+        matches = index.get_matches(port, ip)
+        if not matches:
+            return None
+        return index.fw_rules[(matches & -matches).bit_length() - 1]
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    fw = Firewall()
+    fw.load_csv("500k_rules.csv", MAX_FW_RULES)
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Bit-vector firewall time duration to add rules: {duration}")
+
+    start_time = time.time()
+    print(fw.accept_packet("inbound", "tcp", 80, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "tcp", 81, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 24, "52.12.48.92"))
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Bit-vector firewall time duration to accept packets: {duration}")
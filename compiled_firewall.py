@@ -0,0 +1,382 @@
+"""
+This file implements a firewall which compiles its firewall rules into
+generated Python functions.
+
+This program can be run in the terminal using this command:
+    python3 compiled_firewall.py
+"""
+
+
+import hashlib
+import importlib.util
+import marshal
+import os
+import tempfile
+import time
+from types import CodeType
+from typing import Iterable, List, Optional, Tuple
+
+from firewall import Firewall
+from firewall_rule import FirewallRule
+from ip_address import IPAddress
+
+
+# the max number of firewall rules checked one after another in a tree leaf
+LEAF_SIZE = 8
+
+# the file extension of the cache file stored alongside a CSV file
+CACHE_FILE_EXTENSION = ".fwc"
+
+# the version of the generated code, which should be increased whenever the
+# generated code changes, so that older cache files are not loaded
+CACHE_VERSION = 1
+
+# the indexes of the values in a tuple of firewall rule bounds
+MIN_PORT = 0
+MAX_PORT = 1
+MIN_IP = 2
+MAX_IP = 3
+
+
+def get_staircase(
+    fw_rule_bounds: List[Tuple[int, int, int, int]], port_index: int,
+    ip_index: int
+) -> List[Tuple[int, int]]:
+    """
+    Return the (port limit, IP address limit) tuples of the provided firewall
+    rule bounds which are not dominated by another firewall rule's limits.
+
+    The limits are the values at the provided indexes of each bounds tuple. A
+    max limit is better when it is larger, and a min limit is better when it
+    is smaller.
+    """
+    port_sign = 1 if port_index == MAX_PORT else -1
+    ip_sign = 1 if ip_index == MAX_IP else -1
+    limits = sorted(
+        {(bounds[port_index], bounds[ip_index]) for bounds in fw_rule_bounds},
+        key=lambda limit: (port_sign * limit[0], ip_sign * limit[1]),
+        reverse=True
+    )
+    staircase = []
+    for port_limit, ip_limit in limits:
+        if not staircase or ip_sign * ip_limit > ip_sign * staircase[-1][1]:
+            staircase.append((port_limit, ip_limit))
+    return staircase
+
+
+def generate_quadrants(
+    fw_rule_bounds: List[Tuple[int, int, int, int]], port_center: int,
+    ip_center: int, indent: str, lines: List[str]
+) -> None:
+    """
+    Append the lines which check the provided firewall rule bounds, which all
+    contain the provided port value and IP address.
+
+    A packet above both center values matches one of these firewall rules
+    when its port value and IP address are at most the rule's max port and
+    max IP address, and similarly for the other three quadrants. So each
+    quadrant only checks the limits which are not dominated by the limits of
+    another firewall rule.
+    """
+    for port_condition, port_index in (
+        (f"if port >= {port_center}:", MAX_PORT), ("else:", MIN_PORT)
+    ):
+        lines.append(f"{indent}{port_condition}")
+        for ip_condition, ip_index in (
+            (f"if ip >= {ip_center}:", MAX_IP), ("else:", MIN_IP)
+        ):
+            lines.append(f"{indent}    {ip_condition}")
+            port_operator = "<=" if port_index == MAX_PORT else ">="
+            ip_operator = "<=" if ip_index == MAX_IP else ">="
+            for port_limit, ip_limit in get_staircase(
+                fw_rule_bounds, port_index, ip_index
+            ):
+                lines.append(
+                    f"{indent}        if port {port_operator} {port_limit} "
+                    f"and ip {ip_operator} {ip_limit}:"
+                )
+                lines.append(f"{indent}            return True")
+
+
+def generate_tree(
+    fw_rule_bounds: List[Tuple[int, int, int, int]], indent: str,
+    lines: List[str], port_center: Optional[int] = None
+) -> None:
+    """
+    Append the lines of an if-tree which returns `True` when the `port` and
+    `ip` variables match one of the provided firewall rule bounds. Each
+    bounds tuple is: min port, max port, min IP address, and max IP address.
+
+    The if-tree is a centered interval tree of port values. Each node checks
+    the firewall rules which contain its center port value, and its two
+    subtrees check the firewall rules which are entirely below or above the
+    center port value. The firewall rules of a node are checked with a
+    centered interval tree of IP addresses, which is generated when a port
+    center value is provided.
+    """
+    if len(fw_rule_bounds) <= LEAF_SIZE:
+        for min_port, max_port, min_ip, max_ip in fw_rule_bounds:
+            lines.append(
+                f"{indent}if {min_port} <= port <= {max_port} and "
+                f"{min_ip} <= ip <= {max_ip}:"
+            )
+            lines.append(f"{indent}    return True")
+        return
+
+    if port_center is None:
+        min_index, max_index, variable = MIN_PORT, MAX_PORT, "port"
+    else:
+        min_index, max_index, variable = MIN_IP, MAX_IP, "ip"
+    centers = sorted(
+        (bounds[min_index] + bounds[max_index]) // 2
+        for bounds in fw_rule_bounds
+    )
+    center = centers[len(centers) // 2]
+    below = []
+    above = []
+    middle = []
+    for bounds in fw_rule_bounds:
+        if bounds[max_index] < center:
+            below.append(bounds)
+        elif bounds[min_index] > center:
+            above.append(bounds)
+        else:
+            middle.append(bounds)
+
+    if middle and port_center is None:
+        generate_tree(middle, indent, lines, port_center=center)
+    elif middle:
+        generate_quadrants(middle, port_center, center, indent, lines)
+    if below:
+        lines.append(f"{indent}if {variable} < {center}:")
+        generate_tree(below, indent + "    ", lines, port_center)
+    if above:
+        lines.append(f"{indent}if {variable} > {center}:")
+        generate_tree(above, indent + "    ", lines, port_center)
+
+
+def load_cache_file(
+    cache_file_path: str, header: bytes
+) -> Optional[CodeType]:
+    """
+    Return the code object of the provided cache file, or `None` if the cache
+    file doesn't exist, cannot be read, has a different header, or is
+    corrupt.
+    """
+    try:
+        with open(cache_file_path, "rb") as cache_file:
+            cache = cache_file.read()
+    except OSError:
+        return None
+    if not cache.startswith(header):
+        return None
+    try:
+        return marshal.loads(cache[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def write_cache_file(
+    cache_file_path: str, header: bytes, code: CodeType
+) -> None:
+    """
+    Write the provided header and code object to the cache file. The cache
+    file is written to a temporary file in the same directory, which then
+    replaces the cache file. Nothing is written if the directory is not
+    writable.
+    """
+    try:
+        fd, temp_file_path = tempfile.mkstemp(
+            dir=os.path.dirname(cache_file_path) or ".",
+            suffix=CACHE_FILE_EXTENSION
+        )
+    except OSError:
+        # continue without the cache file
+        return
+    try:
+        with os.fdopen(fd, "wb") as temp_file:
+            temp_file.write(header + marshal.dumps(code))
+        os.replace(temp_file_path, cache_file_path)
+    except OSError:
+        # continue without the cache file
+        os.remove(temp_file_path)
+
+
+class CompiledFirewall(Firewall):
+    """
+    A data structure to represent a firewall which compiles its firewall
+    rules into Python functions.
+
+    The firewall rules are stored in the same way as in `Firewall`. In
+    addition, the firewall rules with a range of values of each direction and
+    protocol combination are compiled into a generated Python function. The
+    function is an if-tree of integer comparisons against the port value and
+    the IP address of a packet, so no `FirewallRule.is_match()` calls or
+    `IPAddress` objects are needed to check a firewall rule.
+
+    Deciding to accept a packet checks the hash-map of single value firewall
+    rules, and then calls the one compiled function of the packet's direction
+    and protocol. Adding or removing firewall rules with a range of values
+    makes the firewall fall back to iterating through the buckets, until
+    `compile_fw_rules()` is called again. The buckets are also used when hits
+    are counted.
+
+    Freezing the firewall compiles the firewall rules for the last time, so a
+    frozen firewall never falls back to the buckets.
+
+    The compiled functions can be cached in a file. When the firewall rules
+    are read from a CSV file, the cache file is stored alongside the CSV file,
+    so that the functions don't have to be generated or compiled again on
+    restart. The cache file is identified by a hash of the CSV file, so it is
+    checked before any source code is generated.
+    """
+
+    def __init__(
+        self, csv_file_path: Optional[str] = None, use_cache: bool = True,
+        **kwargs
+    ):
+        """
+        Initialize the firewall by reading and storing the firewall rules of
+        the CSV file, and compile them. The other keyword arguments are passed
+        to `Firewall`.
+        """
+        self.compiled_functions = None
+        super().__init__(csv_file_path, **kwargs)
+        if csv_file_path:
+            if use_cache:
+                with open(csv_file_path, "rb") as csv_file:
+                    cache_key = hashlib.sha256(csv_file.read()).digest()
+                self.compile_fw_rules(
+                    csv_file_path + CACHE_FILE_EXTENSION, cache_key
+                )
+            else:
+                self.compile_fw_rules()
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the data structure."""
+        super().add_fw_rule(fw_rule)
+        if not fw_rule.is_single_value():
+            self.compiled_functions = None
+
+    def add_fw_rules(self, fw_rules: Iterable[FirewallRule]) -> None:
+        """Add the provided firewall rules to the data structure."""
+        super().add_fw_rules(fw_rules)
+        self.compiled_functions = None
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Remove the provided firewall rule from the data structure."""
+        super().remove_fw_rule(fw_rule)
+        if not fw_rule.is_single_value():
+            self.compiled_functions = None
+
+    def freeze(self) -> None:
+        """
+        Compile the firewall rules if they were changed since they were last
+        compiled, and prevent them from being added or removed from now on.
+        """
+        if self.compiled_functions is None:
+            self.compile_fw_rules()
+        super().freeze()
+
+    def generate_source(self) -> str:
+        """
+        Return the Python source code of a function for each direction and
+        protocol combination. The function of inbound TCP packets is named
+        `accept_inbound_tcp`, and takes a port value and an integer IP
+        address.
+        """
+        lines = []
+        for direction, protocols in self.fw_rules.items():
+            for protocol, buckets in protocols.items():
+                fw_rule_bounds = sorted({
+                    (
+                        fw_rule.min_port, fw_rule.max_port,
+                        fw_rule.min_ip.to_int(), fw_rule.max_ip.to_int()
+                    )
+                    for bucket in buckets
+                    for fw_rule in bucket
+                })
+                lines.append(f"def accept_{direction}_{protocol}(port, ip):")
+                generate_tree(fw_rule_bounds, "    ", lines)
+                lines.append("    return False")
+                lines.append("")
+        return "\n".join(lines)
+
+    def compile_fw_rules(
+        self, cache_file_path: Optional[str] = None,
+        cache_key: Optional[bytes] = None
+    ) -> None:
+        """
+        Compile the firewall rules into functions. When a cache file path is
+        provided, the compiled code is loaded from the cache file if it was
+        compiled from the same cache key by the same version of this file and
+        of Python, and is otherwise written to the cache file. The cache key
+        must identify the firewall rules, such as a hash of the CSV file they
+        were read from, and is a hash of the generated source code when it is
+        not provided.
+
+        The firewall rules are still compiled when the cache file cannot be
+        read or written, such as in a read-only directory, or when it is
+        corrupt. The cache file is written to a temporary file which then
+        replaces it, so a crash while writing never leaves a partial cache
+        file.
+        """
+        source = None
+        if cache_key is None:
+            source = self.generate_source()
+            cache_key = hashlib.sha256(source.encode()).digest()
+        header = importlib.util.MAGIC_NUMBER + hashlib.sha256(
+            f"{CACHE_VERSION},{LEAF_SIZE},".encode() + cache_key
+        ).digest()
+        code = None
+        if cache_file_path:
+            code = load_cache_file(cache_file_path, header)
+        if code is None:
+            if source is None:
+                source = self.generate_source()
+            code = compile(source, "<compiled firewall>", "exec")
+            if cache_file_path:
+                write_cache_file(cache_file_path, header, code)
+
+        namespace = {}
+        exec(code, namespace)
+        self.compiled_functions = {
+            direction: {
+                protocol: namespace[f"accept_{direction}_{protocol}"]
+                for protocol in protocols
+            }
+            for direction, protocols in self.fw_rules.items()
+        }
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        if self.compiled_functions is None or self.hit_sample_rate:
+            return super().accept_packet(
+                direction, protocol, port, ip_address
+            )
+        ip = IPAddress(ip_address).to_int()
+        if (direction, protocol, port, ip) in self.exact_fw_rules:
+            return True
+        return self.compiled_functions[direction][protocol](port, ip)
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    fw = CompiledFirewall("500k_rules.csv")
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Compiled firewall time duration to add rules: {duration}")
+
+    start_time = time.time()
+    print(fw.accept_packet("inbound", "tcp", 80, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "tcp", 81, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 24, "52.12.48.92"))
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Compiled firewall time duration to accept packets: {duration}")
@@ -0,0 +1,140 @@
+"""
+This file defines the common interface of the firewall engines, and a
+registry to choose a firewall engine by name.
+"""
+
+
+import abc
+import csv
+import importlib
+import itertools
+from typing import Iterable, List, Optional, Tuple
+
+from firewall_rule import FirewallRule
+
+
+# the (module name, class name) tuple of each registered firewall engine
+ENGINES = {
+    "bitvector_firewall": ("bitvector_firewall", "Firewall"),
+    "compiled_firewall": ("compiled_firewall", "CompiledFirewall"),
+    "firewall": ("firewall", "Firewall"),
+    "hicuts_firewall": ("hicuts_firewall", "Firewall"),
+    "layered_firewall": ("layered_firewall", "LayeredFirewall"),
+    "naive_firewall": ("naive_firewall", "Firewall"),
+    "sharded_firewall": ("sharded_firewall", "ShardedFirewall"),
+    "tss_firewall": ("tss_firewall", "Firewall"),
+}
+
+
+class FirewallEngine(abc.ABC):
+    """
+    The base class of a firewall engine. A firewall engine stores a set of
+    firewall rules, and decides whether to accept packets with them.
+
+    Each engine initializes its own data structure in its constructor, and
+    then calls this constructor to load the firewall rules of a CSV file. An
+    engine must implement the abstract methods `add_fw_rule()`,
+    `remove_fw_rule()`, and `accept_packet()`, so an engine which is missing
+    one of them raises a `TypeError` when it is created. It can override
+    `add_fw_rules()` and `accept_packets()` when it can handle many firewall
+    rules or packets faster than one at a time, and `close()` when it has
+    resources to release, such as worker processes.
+
+    An engine whose memory grows too fast to store all the firewall rules of
+    a generated CSV file sets `max_fw_rules` to the number of firewall rules
+    it can store.
+    """
+
+    max_fw_rules = None
+
+    def __init__(self, csv_file_path: Optional[str] = None):
+        """
+        Initialize the firewall by reading and storing the firewall rules of
+        the CSV file.
+        """
+        if csv_file_path:
+            self.load_csv(csv_file_path)
+
+    def load_csv(
+        self, csv_file_path: str, max_fw_rules: Optional[int] = None
+    ) -> None:
+        """
+        Add the firewall rules of the CSV file. Only the first `max_fw_rules`
+        rows are read when it is provided. Duplicate rows are removed before
+        they are parsed.
+        """
+        with open(csv_file_path, "r") as csv_file:
+            csv_reader = csv.reader(csv_file)
+            csv_fw_rules = dict.fromkeys(
+                itertools.islice(map(tuple, csv_reader), max_fw_rules)
+            )
+        self.add_fw_rules(
+            FirewallRule(*csv_fw_rule) for csv_fw_rule in csv_fw_rules
+        )
+
+    @abc.abstractmethod
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the data structure."""
+
+    def add_fw_rules(self, fw_rules: Iterable[FirewallRule]) -> None:
+        """Add the provided firewall rules to the data structure."""
+        for fw_rule in fw_rules:
+            self.add_fw_rule(fw_rule)
+
+    @abc.abstractmethod
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the data structure. Nothing is
+        removed if the firewall rule was not added.
+        """
+
+    @abc.abstractmethod
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+
+    def accept_packets(
+        self, packets: Iterable[Tuple[str, str, int, str]]
+    ) -> List[bool]:
+        """
+        Determine whether the firewall can accept each of the provided
+        packets. Each packet is a tuple of: direction, protocol, port, and IP
+        address.
+        """
+        return [self.accept_packet(*packet) for packet in packets]
+
+    def close(self) -> None:
+        """Release the resources of the firewall. Nothing is released here."""
+
+    def __enter__(self):
+        """Returns the firewall when entering a `with` statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Closes the firewall when exiting a `with` statement."""
+        self.close()
+
+
+def register_engine(name: str, module_name: str, class_name: str) -> None:
+    """
+    Register the firewall engine class of the provided module by name. The
+    module is only imported when the firewall engine is used.
+    """
+    ENGINES[name] = (module_name, class_name)
+
+
+def get_engine(name: str) -> type:
+    """
+    Return the firewall engine class registered with the provided name.
+    Raise a `KeyError` if no firewall engine has the name.
+    """
+    if name not in ENGINES:
+        raise KeyError(
+            f"unknown firewall engine {name!r}, choose from: "
+            f"{', '.join(sorted(ENGINES))}"
+        )
+    module_name, class_name = ENGINES[name]
+    return getattr(importlib.import_module(module_name), class_name)
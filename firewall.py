@@ -7,14 +7,61 @@ This program can be run in the terminal using this command:
 """
 
 
+import contextlib
 import csv
+import gc
+import heapq
+import itertools
 import time
-from typing import Optional
+from collections import Counter
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
 
+from engine import FirewallEngine
 from firewall_rule import FirewallRule
+from ip_address import IPAddress
 
 
-class Firewall(object):
+# the max number of the hottest firewall rules of a bucket, which are checked
+# before the rest of the bucket
+NUM_HOT_FW_RULES = 32
+
+
+@contextlib.contextmanager
+def pause_gc() -> Iterator[None]:
+    """
+    Pause the garbage collector until the end of the `with` statement, unless
+    it was already paused. Adding many firewall rules creates millions of
+    objects, and none of them are garbage, so the collections the garbage
+    collector would run are wasted time.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def get_ip_range(ip_address: str) -> Tuple[int, int]:
+    """
+    Return the min and max integer IP addresses of the provided IP address,
+    which can be a single value (i.e. "10.0.0.1"), a range of values (i.e.
+    "10.0.0.1-10.0.0.9"), or a CIDR block (i.e. "10.0.0.0/8").
+    """
+    if "/" in ip_address:
+        ip_address, prefix_len = ip_address.split("/")
+        mask = (0xFFFFFFFF << (32 - int(prefix_len))) & 0xFFFFFFFF
+        min_ip = IPAddress(ip_address).to_int() & mask
+        return min_ip, min_ip | (~mask & 0xFFFFFFFF)
+    ip_addresses = ip_address.split("-")
+    return (
+        IPAddress(ip_addresses[0]).to_int(),
+        IPAddress(ip_addresses[-1]).to_int()
+    )
+
+
+class Firewall(FirewallEngine):
     """
     A data structure to represent a firewall. A firewall contains a list of
     firewall rules.
@@ -43,15 +90,56 @@ class Firewall(object):
     a firewall rule with fields:
     (direction="inbound", protocol="tcp", port="50-2000", IP address="1.1.1.1")
     would belong to Combination 1's bucket 0 and bucket 1.
+
+    Firewall rules with a single port value and a single IP address are not
+    stored in the buckets. They are stored in a hash-map whose keys are
+    (direction, protocol, port, IP address) tuples, where the IP address is an
+    integer. Deciding to accept a packet first checks this hash-map with a
+    single lookup, and only iterates through a bucket when the packet does not
+    match a single value firewall rule. The single value firewall rules are
+    also indexed by their (direction, protocol, port) tuples, in hash-maps
+    whose keys are their integer IP addresses, so that the firewall rules of
+    a port can be queried without scanning the hash-map. Neither hash-map
+    has to hash the firewall rules themselves.
+
+    The firewall can optionally count how many packets each firewall rule
+    matches. To keep counting cheap, only one in every `hit_sample_rate`
+    packets is counted. Every `reorder_interval` packets, each bucket which
+    had hits gets a short list of its `NUM_HOT_FW_RULES` hottest firewall
+    rules, ordered by hit count, which is checked before the rest of the
+    bucket. Only the firewall rules which had hits are sorted, so reordering
+    takes time in proportion to the number of sampled hits rather than the
+    size of the buckets. The counts can be exported to find hot firewall
+    rules and firewall rules which never match.
+
+    Firewall rules with an expiry time are also stored in a min-heap ordered
+    by expiry time. Deciding to accept a packet never checks expiry times.
+    Instead, `remove_expired_fw_rules()` should be called periodically to pop
+    the expired firewall rules off the heap and remove them from the data
+    structure. It can remove a limited number of firewall rules per call, so
+    that removing many firewall rules doesn't delay deciding to accept
+    packets.
+
+    A firewall can be frozen with `freeze()` once it is shared, after which
+    adding or removing firewall rules raises a `RuntimeError`.
+
+    `query_fw_rules()` returns the firewall rules which overlap a range of
+    port values and IP addresses. It only checks the buckets and the single
+    value firewall rules of the queried port values, and yields each firewall
+    rule as soon as it is found, so large answers don't have to be stored.
     """
 
-    def __init__(self, csv_file_path: Optional[str] = None):
+    def __init__(
+        self, csv_file_path: Optional[str] = None, num_buckets: int = 64,
+        hit_sample_rate: int = 0, reorder_interval: int = 100000
+    ):
         """
         Initialize the firewall by reading and storing the firewall rules of
-        the CSV file.
+        the CSV file. The number of buckets must be a power of 2, and a small
+        number of buckets can be used for a small number of firewall rules.
+        Hits are not counted when the hit sample rate is 0.
         """
         # initialize the data structure to store firewall rules
-        num_buckets = 64
         self.num_ports_bucket = 65536 // num_buckets
         self.fw_rules = {
             "inbound": {
@@ -63,34 +151,406 @@ class Firewall(object):
                 "udp": [set() for i in range(num_buckets)],
             },
         }
+        self.exact_fw_rules = {}
+        self.exact_port_fw_rules = {}
+
+        # initialize the hit counts, the firewall rules of each bucket which
+        # had hits since the last reorder, and the hottest firewall rules of
+        # each bucket ordered by hit count
+        self.hit_sample_rate = hit_sample_rate
+        self.reorder_interval = reorder_interval
+        self.num_packets = 0
+        self.hit_counts = Counter()
+        self.hit_buckets = {}
+        self.ordered_fw_rules = {
+            "inbound": {
+                "tcp": [()] * num_buckets, "udp": [()] * num_buckets,
+            },
+            "outbound": {
+                "tcp": [()] * num_buckets, "udp": [()] * num_buckets,
+            },
+        }
+
+        # initialize the heap of (expiry time, sequence number, firewall rule)
+        # tuples, and the current expiry time of each firewall rule
+        self.expiry_heap = []
+        self.expiry_sequence = itertools.count()
+        self.fw_rule_expiry = {}
+        self.frozen = False
 
         # read firewall rules from CSV file and add them to the data structure
-        if csv_file_path:
-            with open(csv_file_path, "r") as csv_file:
-                csv_reader = csv.reader(csv_file)
-                for csv_fw_rule in csv_reader:
-                    fw_rule = FirewallRule(*csv_fw_rule)
-                    self.add_fw_rule(fw_rule)
+        super().__init__(csv_file_path)
+
+    def freeze(self) -> None:
+        """
+        Prevent the firewall rules from being added or removed from now on.
+        """
+        self.frozen = True
+
+    def check_not_frozen(self) -> None:
+        """Raise a `RuntimeError` if the firewall is frozen."""
+        if self.frozen:
+            raise RuntimeError(
+                "the firewall rules of a frozen firewall cannot be changed"
+            )
+
+    def load_csv(
+        self, csv_file_path: str, max_fw_rules: Optional[int] = None
+    ) -> None:
+        """
+        Add the firewall rules of the CSV file, as `FirewallEngine` does, with
+        the garbage collector paused while the rows are read.
+        """
+        with pause_gc():
+            super().load_csv(csv_file_path, max_fw_rules)
 
     def add_fw_rule(self, fw_rule: FirewallRule) -> None:
         """Add the provided firewall rule to the data structure."""
+        self.check_not_frozen()
+        self.schedule_expiry(fw_rule)
+        if fw_rule.is_single_value():
+            self.add_exact_fw_rule(fw_rule)
+            return
         start_bucket = fw_rule.min_port // self.num_ports_bucket
         end_bucket = fw_rule.max_port // self.num_ports_bucket
         curr_fw_rules = self.fw_rules[fw_rule.direction][fw_rule.protocol]
         for bucket_num in range(start_bucket, end_bucket + 1):
             curr_fw_rules[bucket_num].add(fw_rule)
 
+    def add_fw_rules(self, fw_rules: Iterable[FirewallRule]) -> None:
+        """
+        Add the provided firewall rules to the data structure. This is faster
+        than adding the firewall rules one at a time.
+
+        The firewall rules with a range of values are first grouped by their
+        direction, protocol, start bucket, and end bucket. Then the buckets of
+        each direction and protocol combination are built in a single pass,
+        which keeps a hash-set of the firewall rules that overlap the current
+        bucket. Each firewall rule is hashed when it enters and leaves this
+        hash-set, and the hash-set is copied into each bucket without hashing
+        its firewall rules again. The garbage collector is paused while the
+        firewall rules are added.
+        """
+        self.check_not_frozen()
+        num_buckets = 65536 // self.num_ports_bucket
+        num_ports_bucket = self.num_ports_bucket
+        start_fw_rules = {}
+        end_fw_rules = {}
+        with pause_gc():
+            for fw_rule in fw_rules:
+                # firewall rules without an expiry time only need to be
+                # scheduled when they may replace a firewall rule with one
+                if fw_rule.expires_at is not None or self.fw_rule_expiry:
+                    self.schedule_expiry(fw_rule)
+                if fw_rule.is_single_value():
+                    self.add_exact_fw_rule(fw_rule)
+                    continue
+                combination = (fw_rule.direction, fw_rule.protocol)
+                starts = start_fw_rules.get(combination)
+                if starts is None:
+                    starts = [[] for i in range(num_buckets)]
+                    start_fw_rules[combination] = starts
+                    end_fw_rules[combination] = [
+                        [] for i in range(num_buckets)
+                    ]
+                starts[fw_rule.min_port // num_ports_bucket].append(fw_rule)
+                end_fw_rules[combination][
+                    fw_rule.max_port // num_ports_bucket
+                ].append(fw_rule)
+
+            for (direction, protocol), starts in start_fw_rules.items():
+                ends = end_fw_rules[(direction, protocol)]
+                curr_fw_rules = self.fw_rules[direction][protocol]
+                overlapping_fw_rules = set()
+                for bucket_num in range(num_buckets):
+                    overlapping_fw_rules.update(starts[bucket_num])
+                    if overlapping_fw_rules:
+                        curr_fw_rules[bucket_num].update(overlapping_fw_rules)
+                    overlapping_fw_rules.difference_update(ends[bucket_num])
+
+    def add_exact_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Add the provided single value firewall rule to the hash-map of single
+        value firewall rules, and to the index of their ports.
+        """
+        ip = fw_rule.min_ip.to_int()
+        key = (fw_rule.direction, fw_rule.protocol, fw_rule.min_port, ip)
+        self.exact_fw_rules[key] = fw_rule
+        port_key = (fw_rule.direction, fw_rule.protocol, fw_rule.min_port)
+        port_fw_rules = self.exact_port_fw_rules.get(port_key)
+        if port_fw_rules is None:
+            port_fw_rules = {}
+            self.exact_port_fw_rules[port_key] = port_fw_rules
+        port_fw_rules[ip] = fw_rule
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the data structure. Nothing is
+        removed if the firewall rule was not added.
+        """
+        self.check_not_frozen()
+        self.fw_rule_expiry.pop(fw_rule, None)
+        self.hit_counts.pop(fw_rule, None)
+        if fw_rule.is_single_value():
+            ip = fw_rule.min_ip.to_int()
+            key = (fw_rule.direction, fw_rule.protocol, fw_rule.min_port, ip)
+            self.exact_fw_rules.pop(key, None)
+            port_key = (fw_rule.direction, fw_rule.protocol, fw_rule.min_port)
+            port_fw_rules = self.exact_port_fw_rules.get(port_key)
+            if port_fw_rules is not None:
+                port_fw_rules.pop(ip, None)
+                if not port_fw_rules:
+                    del self.exact_port_fw_rules[port_key]
+            return
+        start_bucket = fw_rule.min_port // self.num_ports_bucket
+        end_bucket = fw_rule.max_port // self.num_ports_bucket
+        curr_fw_rules = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        ordered_fw_rules = (
+            self.ordered_fw_rules[fw_rule.direction][fw_rule.protocol]
+        )
+        for bucket_num in range(start_bucket, end_bucket + 1):
+            if fw_rule in curr_fw_rules[bucket_num]:
+                curr_fw_rules[bucket_num].discard(fw_rule)
+                hit_fw_rules = self.hit_buckets.get(
+                    (fw_rule.direction, fw_rule.protocol, bucket_num)
+                )
+                if hit_fw_rules is not None:
+                    hit_fw_rules.discard(fw_rule)
+                if fw_rule in ordered_fw_rules[bucket_num]:
+                    ordered_fw_rules[bucket_num] = tuple(
+                        hot_fw_rule
+                        for hot_fw_rule in ordered_fw_rules[bucket_num]
+                        if hot_fw_rule != fw_rule
+                    )
+
+    def schedule_expiry(self, fw_rule: FirewallRule) -> None:
+        """
+        Record the expiry time of the provided firewall rule. Adding a
+        firewall rule again replaces its expiry time, and adding it without an
+        expiry time keeps it until it is removed.
+        """
+        if fw_rule.expires_at is None:
+            self.fw_rule_expiry.pop(fw_rule, None)
+            return
+        self.fw_rule_expiry[fw_rule] = fw_rule.expires_at
+        heapq.heappush(
+            self.expiry_heap,
+            (fw_rule.expires_at, next(self.expiry_sequence), fw_rule)
+        )
+
+    def remove_expired_fw_rules(
+        self, now: Optional[float] = None,
+        max_fw_rules: Optional[int] = None
+    ) -> int:
+        """
+        Remove the firewall rules whose expiry time is at or before the
+        provided time, which is the current time by default. At most
+        `max_fw_rules` firewall rules are removed when it is provided. Return
+        the number of firewall rules which were removed.
+
+        Heap entries of firewall rules which were removed, or added again with
+        a different expiry time, are skipped.
+        """
+        self.check_not_frozen()
+        if now is None:
+            now = time.time()
+        num_removed = 0
+        while self.expiry_heap and self.expiry_heap[0][0] <= now:
+            if max_fw_rules is not None and num_removed >= max_fw_rules:
+                break
+            expires_at, _, fw_rule = heapq.heappop(self.expiry_heap)
+            if self.fw_rule_expiry.get(fw_rule) != expires_at:
+                continue
+            self.remove_fw_rule(fw_rule)
+            num_removed += 1
+        return num_removed
+
     def accept_packet(
         self, direction: str, protocol: str, port: int, ip_address: str
     ) -> bool:
         """
         Determine whether the firewall can accept the packet with its rules.
         """
+        fw_rule = self.get_match(direction, protocol, port, ip_address)
+        if self.hit_sample_rate:
+            self.count_hit(direction, protocol, port, fw_rule)
+        return fw_rule is not None
+
+    def get_match(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> Optional[FirewallRule]:
+        """
+        Return a firewall rule which matches the packet, or `None` if no
+        firewall rule matches the packet.
+        """
+        key = (direction, protocol, port, IPAddress(ip_address).to_int())
+        fw_rule = self.exact_fw_rules.get(key)
+        if fw_rule is not None:
+            return fw_rule
         bucket_num = port // self.num_ports_bucket
+        # check the hottest firewall rules of the bucket first
+        for fw_rule in self.ordered_fw_rules[direction][protocol][bucket_num]:
+            if fw_rule.is_match(direction, protocol, port, ip_address):
+                return fw_rule
         for fw_rule in self.fw_rules[direction][protocol][bucket_num]:
             if fw_rule.is_match(direction, protocol, port, ip_address):
-                return True
-        return False
+                return fw_rule
+        return None
+
+    def count_hit(
+        self, direction: str, protocol: str, port: int,
+        fw_rule: Optional[FirewallRule]
+    ) -> None:
+        """
+        Count a packet, which matched the provided firewall rule, if it is
+        sampled. Reorder the buckets once every `reorder_interval` packets.
+        """
+        self.num_packets += 1
+        if (
+            fw_rule is not None and
+            self.num_packets % self.hit_sample_rate == 0
+        ):
+            self.hit_counts[fw_rule] += 1
+            # single value firewall rules are not stored in the buckets
+            if not fw_rule.is_single_value():
+                bucket_num = port // self.num_ports_bucket
+                key = (direction, protocol, bucket_num)
+                if key not in self.hit_buckets:
+                    self.hit_buckets[key] = set()
+                self.hit_buckets[key].add(fw_rule)
+        if self.num_packets % self.reorder_interval == 0:
+            self.reorder_buckets()
+
+    def reorder_buckets(self) -> None:
+        """
+        Update the hottest firewall rules of each bucket which had hits since
+        the last reorder, so that they are checked first. Only the previous
+        hottest firewall rules and the firewall rules which had hits are
+        sorted, not the whole bucket.
+        """
+        for (direction, protocol, bucket_num), hit_fw_rules in (
+            self.hit_buckets.items()
+        ):
+            ordered_fw_rules = self.ordered_fw_rules[direction][protocol]
+            hit_fw_rules.update(ordered_fw_rules[bucket_num])
+            ordered_fw_rules[bucket_num] = tuple(heapq.nlargest(
+                NUM_HOT_FW_RULES, hit_fw_rules,
+                key=self.hit_counts.__getitem__
+            ))
+        self.hit_buckets.clear()
+
+    def query_fw_rules(
+        self, port: str, ip_address: str, direction: Optional[str] = None,
+        protocol: Optional[str] = None
+    ) -> Iterator[FirewallRule]:
+        """
+        Yield each firewall rule which overlaps the provided port values and
+        IP addresses. The port can be a single value or a range of values, and
+        the IP address can be a single value, a range of values, or a CIDR
+        block. All directions and protocols are queried when they are not
+        provided.
+
+        Each firewall rule is yielded as soon as it is found, so large answers
+        are never stored. A firewall rule is stored in every bucket it
+        overlaps, so it is only yielded from the first bucket which it shares
+        with the query, and only the firewall rules which start in each of the
+        other queried buckets are checked. Firewall rules must not be added or
+        removed while the results are consumed, so wrap the query in `list()`
+        to change the firewall rules it returns.
+        """
+        ports = port.split("-")
+        min_port = int(ports[0])
+        max_port = int(ports[-1])
+        # compare octet tuples, so no firewall rule's IP address is converted
+        min_octets, max_octets = (
+            tuple((ip >> shift) & 0xFF for shift in (24, 16, 8, 0))
+            for ip in get_ip_range(ip_address)
+        )
+        combinations = [
+            (curr_direction, curr_protocol)
+            for curr_direction, protocols in self.fw_rules.items()
+            for curr_protocol in protocols
+            if direction in (None, curr_direction) and
+            protocol in (None, curr_protocol)
+        ]
+
+        # query the single value firewall rules of each port value, unless
+        # there are fewer indexed ports than queried ports
+        num_ports = (max_port - min_port + 1) * len(combinations)
+        if num_ports <= len(self.exact_port_fw_rules):
+            port_keys = (
+                (curr_direction, curr_protocol, curr_port)
+                for curr_direction, curr_protocol in combinations
+                for curr_port in range(min_port, max_port + 1)
+            )
+        else:
+            port_keys = (
+                port_key for port_key in self.exact_port_fw_rules
+                if port_key[:2] in combinations and
+                min_port <= port_key[2] <= max_port
+            )
+        for port_key in port_keys:
+            port_fw_rules = self.exact_port_fw_rules.get(port_key)
+            if port_fw_rules is None:
+                continue
+            for fw_rule in port_fw_rules.values():
+                if min_octets <= fw_rule.min_ip.octets <= max_octets:
+                    yield fw_rule
+
+        start_bucket = min_port // self.num_ports_bucket
+        end_bucket = max_port // self.num_ports_bucket
+        for curr_direction, curr_protocol in combinations:
+            buckets = self.fw_rules[curr_direction][curr_protocol]
+            for bucket_num in range(start_bucket, end_bucket + 1):
+                if bucket_num == start_bucket:
+                    fw_rules = buckets[bucket_num]
+                else:
+                    # the firewall rules which are also in the previous bucket
+                    # were already yielded, and the set difference of the two
+                    # buckets reuses their stored hash values
+                    fw_rules = buckets[bucket_num] - buckets[bucket_num - 1]
+                for fw_rule in fw_rules:
+                    if (
+                        fw_rule.max_port >= min_port and
+                        fw_rule.min_port <= max_port and
+                        fw_rule.min_ip.octets <= max_octets and
+                        fw_rule.max_ip.octets >= min_octets
+                    ):
+                        yield fw_rule
+
+    def get_fw_rules(self) -> Set[FirewallRule]:
+        """Return all the firewall rules of the firewall."""
+        fw_rules = set(self.exact_fw_rules.values())
+        for protocols in self.fw_rules.values():
+            for buckets in protocols.values():
+                for bucket in buckets:
+                    fw_rules.update(bucket)
+        return fw_rules
+
+    def get_hit_counts(self) -> Dict[FirewallRule, int]:
+        """
+        Return the number of sampled packets which matched each firewall
+        rule. Firewall rules which never matched a sampled packet have a
+        count of 0.
+        """
+        return {
+            fw_rule: self.hit_counts[fw_rule]
+            for fw_rule in self.get_fw_rules()
+        }
+
+    def export_hit_counts(self, csv_file_path: str) -> None:
+        """
+        Write the four fields and the hit count of each firewall rule to a
+        CSV file, from the most to the least matched firewall rule.
+        """
+        hit_counts = sorted(
+            self.get_hit_counts().items(), key=lambda item: item[1],
+            reverse=True
+        )
+        with open(csv_file_path, "w", newline="") as csv_file:
+            csv_writer = csv.writer(csv_file)
+            for fw_rule, hit_count in hit_counts:
+                csv_writer.writerow(fw_rule.get_fields() + (hit_count,))
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 """This file defines the data structure to represent a firewall rule."""
 
 
+from typing import Optional, Tuple
+
 from ip_address import IPAddress
 
 
@@ -35,28 +37,44 @@ class FirewallRule(object):
                    and a max IP address value. The min and max IP address
                    values are initialized similarly to how the min and max port
                    values are initialized.
+
+    A firewall rule can optionally have an expiry time, which is a Unix
+    timestamp after which the firewall rule should be removed. The expiry time
+    is not one of the four fields, so it is not used to compare firewall
+    rules.
     """
 
     def __init__(
-        self, direction: str, protocol: str, port: str, ip_address: str
+        self, direction: str, protocol: str, port: str, ip_address: str,
+        expires_at: Optional[float] = None
     ):
-        """Constructs a firewall rule given the provided four fields."""
+        """
+        Constructs a firewall rule given the provided four fields. The expiry
+        time can be a number or a string, so that it can be read from an
+        optional fifth column of a CSV file.
+        """
+        if expires_at is None or expires_at == "":
+            self.expires_at = None
+        else:
+            self.expires_at = float(expires_at)
         self.direction = direction
         self.protocol = protocol
         ports = port.split("-")
         if len(ports) == 1:
             self.min_port = int(ports[0])
-            self.max_port = int(ports[0])
+            self.max_port = self.min_port
         else:
             self.min_port = int(ports[0])
             self.max_port = int(ports[1])
         ip_addresses = ip_address.split("-")
         if len(ip_addresses) == 1:
+            # a single IP address is parsed once and shared by both values
             self.min_ip = IPAddress(ip_addresses[0])
-            self.max_ip = IPAddress(ip_addresses[0])
+            self.max_ip = self.min_ip
         else:
             self.min_ip = IPAddress(ip_addresses[0])
             self.max_ip = IPAddress(ip_addresses[1])
+        self.hash_value = None
 
     def is_match(
         self, direction: str, protocol: str, port: int, ip_address: str
@@ -76,6 +94,29 @@ class FirewallRule(object):
             return False
         return True
 
+    def is_single_value(self) -> bool:
+        """
+        Determines whether the current `FirewallRule` object has a single port
+        value and a single IP address.
+        """
+        return self.min_port == self.max_port and self.min_ip == self.max_ip
+
+    def get_fields(self) -> Tuple[str, str, str, str]:
+        """
+        Returns the four fields of the current `FirewallRule` object in the
+        format of a CSV file. For example, a firewall rule with a range of
+        port values returns its port as "192-202".
+        """
+        if self.min_port == self.max_port:
+            port = str(self.min_port)
+        else:
+            port = f"{self.min_port}-{self.max_port}"
+        if self.min_ip == self.max_ip:
+            ip_address = str(self.min_ip)
+        else:
+            ip_address = f"{self.min_ip}-{self.max_ip}"
+        return self.direction, self.protocol, port, ip_address
+
     def __eq__(self, other: FirewallRule):
         """Implements the "==" operator to compare `FirewallRule` objects."""
         return (
@@ -88,8 +129,24 @@ class FirewallRule(object):
         )
 
     def __hash__(self):
-        """Returns the hash value of the current `FirewallRule` object."""
-        return hash((
-            self.direction, self.protocol, self.min_port, self.max_port,
-            self.min_ip, self.max_ip
-        ))
+        """
+        Returns the hash value of the current `FirewallRule` object. The hash
+        value is computed once, because a firewall rule may be added to many
+        hash-sets.
+        """
+        if self.hash_value is None:
+            self.hash_value = hash((
+                self.direction, self.protocol, self.min_port, self.max_port,
+                self.min_ip, self.max_ip
+            ))
+        return self.hash_value
+
+    def __getstate__(self):
+        """
+        Returns the attributes of the current `FirewallRule` object to pickle
+        or copy, without its hash value. Strings are hashed differently in
+        each process, so the hash value is computed again after unpickling.
+        """
+        state = self.__dict__.copy()
+        state["hash_value"] = None
+        return state
@@ -0,0 +1,375 @@
+"""
+This file implements a firewall which stores firewall rules in HiCuts-style
+decision trees.
+
+This program can be run in the terminal using this command:
+    python3 hicuts_firewall.py
+"""
+
+
+import time
+from typing import List, Optional, Tuple
+
+from engine import FirewallEngine
+from firewall_rule import FirewallRule
+from ip_address import IPAddress
+
+
+# the two dimensions that a decision tree node can cut
+PORT_DIMENSION = 0
+IP_DIMENSION = 1
+
+# the min and max values of each dimension
+DIMENSION_BOUNDS = {
+    PORT_DIMENSION: (0, 65535),
+    IP_DIMENSION: (0, 2 ** 32 - 1),
+}
+
+
+def get_fw_rule_bounds(fw_rule: FirewallRule) -> Tuple[int, int, int, int]:
+    """
+    Return the min port, max port, min IP address, and max IP address of the
+    provided firewall rule as integers.
+    """
+    return (
+        fw_rule.min_port, fw_rule.max_port, fw_rule.min_ip.to_int(),
+        fw_rule.max_ip.to_int()
+    )
+
+
+def get_dimension_range(
+    bounds: Tuple[int, int, int, int], dimension: int
+) -> Tuple[int, int]:
+    """
+    Return the min and max values, in the provided dimension, of a tuple of:
+    min port, max port, min IP address, and max IP address.
+    """
+    if dimension == PORT_DIMENSION:
+        return bounds[0], bounds[1]
+    return bounds[2], bounds[3]
+
+
+def is_covering(
+    fw_rule_bounds: Tuple[int, int, int, int],
+    region: Tuple[int, int, int, int]
+) -> bool:
+    """
+    Determine whether the provided firewall rule bounds cover the entire
+    provided region.
+    """
+    return (
+        fw_rule_bounds[0] <= region[0] and fw_rule_bounds[1] >= region[1] and
+        fw_rule_bounds[2] <= region[2] and fw_rule_bounds[3] >= region[3]
+    )
+
+
+class DecisionTreeNode(object):
+    """
+    A node of a decision tree. A node covers a region of port values and IP
+    address values.
+
+    A leaf node stores the firewall rules which overlap its region. The rules
+    are stored in a hash-map, which maps each firewall rule to its integer
+    bounds. The rules which cover the entire region of the leaf are stored
+    in a separate hash-map, because every packet that reaches the leaf
+    matches them.
+
+    An internal node cuts its region along one dimension (port or IP address)
+    into equal-width children. The child which covers a value is found with
+    a single division.
+    """
+
+    __slots__ = (
+        "bounds", "depth", "dimension", "cut_width", "children", "fw_rules",
+        "covering_fw_rules", "split_limit",
+    )
+
+    def __init__(self, bounds: Tuple[int, int, int, int], depth: int):
+        """
+        Constructs a leaf node covering the provided region. The region is a
+        tuple of: min port, max port, min IP address, and max IP address.
+        """
+        self.bounds = bounds
+        self.depth = depth
+        self.dimension = None
+        self.cut_width = None
+        self.children = None
+        self.fw_rules = {}
+        self.covering_fw_rules = {}
+        # the number of rules at which splitting this leaf is tried again
+        self.split_limit = 0
+
+
+class Firewall(FirewallEngine):
+    """
+    A data structure to represent a firewall. A firewall contains a list of
+    firewall rules.
+
+    There are four possible combinations of direction and protocol values.
+    Each combination has its own decision tree, which is built in the style
+    of the HiCuts packet classification algorithm.
+
+    The root of each tree covers every port value and every IP address. When
+    a leaf stores more than `leaf_size` firewall rules, it is cut into equal
+    width children along the dimension (port or IP address) which best
+    separates its rules. Each child stores the rules which overlap the child's
+    region. A firewall rule with a range of values may overlap multiple
+    children, so it is replicated into each of them.
+
+    The number of cuts is chosen adaptively. The number of cuts is doubled
+    while the total number of rules in the children, plus the number of
+    children, stays within `space_factor` times the number of rules in the
+    leaf being cut. This keeps rule replication in check. No node is cut into
+    more than `max_cuts` children, and no node is deeper than `max_depth`.
+
+    Deciding to accept a packet walks from the root to a leaf, and then
+    iterates through the small number of rules in the leaf.
+    """
+
+    def __init__(
+        self, csv_file_path: Optional[str] = None, leaf_size: int = 16,
+        space_factor: float = 4.0, max_cuts: int = 64, max_depth: int = 16
+    ):
+        """
+        Initialize the firewall by reading and storing the firewall rules of
+        the CSV file.
+        """
+        self.leaf_size = leaf_size
+        self.space_factor = space_factor
+        self.max_cuts = max_cuts
+        self.max_depth = max_depth
+
+        # initialize the decision trees to store firewall rules
+        root_bounds = (
+            DIMENSION_BOUNDS[PORT_DIMENSION] + DIMENSION_BOUNDS[IP_DIMENSION]
+        )
+        self.fw_rules = {
+            "inbound": {
+                "tcp": DecisionTreeNode(root_bounds, 0),
+                "udp": DecisionTreeNode(root_bounds, 0),
+            },
+            "outbound": {
+                "tcp": DecisionTreeNode(root_bounds, 0),
+                "udp": DecisionTreeNode(root_bounds, 0),
+            },
+        }
+
+        # read firewall rules from CSV file and add them to the data structure
+        super().__init__(csv_file_path)
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the data structure."""
+        fw_rule_bounds = get_fw_rule_bounds(fw_rule)
+        root = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        for leaf in self.get_overlapping_leaves(root, fw_rule_bounds):
+            self.add_to_leaf(leaf, fw_rule, fw_rule_bounds)
+            if (
+                not leaf.covering_fw_rules and
+                len(leaf.fw_rules) > self.leaf_size and
+                len(leaf.fw_rules) > leaf.split_limit
+            ):
+                self.split_leaf(leaf)
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the data structure. Nothing is
+        removed if the firewall rule was not added. The leaves are not merged
+        back together.
+        """
+        fw_rule_bounds = get_fw_rule_bounds(fw_rule)
+        root = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        for leaf in self.get_overlapping_leaves(root, fw_rule_bounds):
+            leaf.fw_rules.pop(fw_rule, None)
+            leaf.covering_fw_rules.pop(fw_rule, None)
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        ip = IPAddress(ip_address).to_int()
+        node = self.fw_rules[direction][protocol]
+        while node.children is not None:
+            if node.dimension == PORT_DIMENSION:
+                value = port - node.bounds[0]
+            else:
+                value = ip - node.bounds[2]
+            node = node.children[value // node.cut_width]
+        if node.covering_fw_rules:
+            return True
+        for min_port, max_port, min_ip, max_ip in node.fw_rules.values():
+            if min_port <= port <= max_port and min_ip <= ip <= max_ip:
+                return True
+        return False
+
+    def add_to_leaf(
+        self, leaf: DecisionTreeNode, fw_rule: FirewallRule,
+        fw_rule_bounds: Tuple[int, int, int, int]
+    ) -> None:
+        """Add the provided firewall rule to the provided leaf."""
+        if is_covering(fw_rule_bounds, leaf.bounds):
+            leaf.covering_fw_rules[fw_rule] = fw_rule_bounds
+        else:
+            leaf.fw_rules[fw_rule] = fw_rule_bounds
+
+    def get_overlapping_leaves(
+        self, node: DecisionTreeNode,
+        fw_rule_bounds: Tuple[int, int, int, int]
+    ) -> List[DecisionTreeNode]:
+        """
+        Return the leaves under the provided node whose regions overlap the
+        provided firewall rule bounds.
+        """
+        leaves = []
+        nodes = [node]
+        while nodes:
+            node = nodes.pop()
+            if node.children is None:
+                leaves.append(node)
+                continue
+            region_min, region_max = get_dimension_range(
+                node.bounds, node.dimension
+            )
+            rule_min, rule_max = get_dimension_range(
+                fw_rule_bounds, node.dimension
+            )
+            start_child = (max(rule_min, region_min) - region_min) // (
+                node.cut_width
+            )
+            end_child = (min(rule_max, region_max) - region_min) // (
+                node.cut_width
+            )
+            nodes.extend(node.children[start_child:end_child + 1])
+        return leaves
+
+    def choose_cuts(self, leaf: DecisionTreeNode) -> Tuple[int, int, int]:
+        """
+        Choose the dimension and number of cuts to split the provided leaf.
+
+        Return a tuple of: the dimension, the number of cuts, and the size of
+        the largest child. The number of cuts is 0 if the leaf cannot be
+        split in a way which separates its rules.
+        """
+        num_fw_rules = len(leaf.fw_rules)
+        max_space = self.space_factor * num_fw_rules
+        best = (PORT_DIMENSION, 0, num_fw_rules)
+        for dimension in (PORT_DIMENSION, IP_DIMENSION):
+            region_min, region_max = get_dimension_range(
+                leaf.bounds, dimension
+            )
+            region_size = region_max - region_min + 1
+            num_cuts = 2
+            chosen = None
+            while num_cuts <= self.max_cuts and num_cuts <= region_size:
+                child_sizes = self.get_child_sizes(
+                    leaf, dimension, region_min, region_size // num_cuts,
+                    num_cuts
+                )
+                if chosen and sum(child_sizes) + num_cuts > max_space:
+                    break
+                chosen = (dimension, num_cuts, max(child_sizes))
+                num_cuts *= 2
+            if chosen and chosen[2] < best[2]:
+                best = chosen
+        return best
+
+    def get_child_sizes(
+        self, leaf: DecisionTreeNode, dimension: int, region_min: int,
+        cut_width: int, num_cuts: int
+    ) -> List[int]:
+        """
+        Return the number of rules that each child would store if the leaf
+        were cut into the provided number of children.
+        """
+        # count the rules starting and ending in each child, then sum them
+        deltas = [0] * (num_cuts + 1)
+        for fw_rule_bounds in leaf.fw_rules.values():
+            rule_min, rule_max = get_dimension_range(fw_rule_bounds, dimension)
+            start_child = (max(rule_min, region_min) - region_min) // cut_width
+            end_child = min(
+                (rule_max - region_min) // cut_width, num_cuts - 1
+            )
+            deltas[start_child] += 1
+            deltas[end_child + 1] -= 1
+        child_sizes = []
+        size = 0
+        for delta in deltas[:num_cuts]:
+            size += delta
+            child_sizes.append(size)
+        return child_sizes
+
+    def split_leaf(self, leaf: DecisionTreeNode) -> None:
+        """
+        Cut the provided leaf into children, and recursively cut the children
+        which store too many firewall rules.
+        """
+        leaves = [leaf]
+        while leaves:
+            leaf = leaves.pop()
+            if leaf.depth >= self.max_depth:
+                leaf.split_limit = float("inf")
+                continue
+            dimension, num_cuts, _ = self.choose_cuts(leaf)
+            if num_cuts == 0:
+                # the rules cannot be separated, so only try again once the
+                # number of rules in the leaf has doubled
+                leaf.split_limit = 2 * len(leaf.fw_rules)
+                continue
+
+            region_min, region_max = get_dimension_range(
+                leaf.bounds, dimension
+            )
+            cut_width = (region_max - region_min + 1) // num_cuts
+            children = []
+            for child_num in range(num_cuts):
+                child_min = region_min + child_num * cut_width
+                child_max = child_min + cut_width - 1
+                if dimension == PORT_DIMENSION:
+                    bounds = (child_min, child_max) + leaf.bounds[2:]
+                else:
+                    bounds = leaf.bounds[:2] + (child_min, child_max)
+                children.append(DecisionTreeNode(bounds, leaf.depth + 1))
+            for fw_rule, fw_rule_bounds in leaf.fw_rules.items():
+                rule_min, rule_max = get_dimension_range(
+                    fw_rule_bounds, dimension
+                )
+                start_child = (max(rule_min, region_min) - region_min) // (
+                    cut_width
+                )
+                end_child = (min(rule_max, region_max) - region_min) // (
+                    cut_width
+                )
+                for child in children[start_child:end_child + 1]:
+                    self.add_to_leaf(child, fw_rule, fw_rule_bounds)
+
+            leaf.dimension = dimension
+            leaf.cut_width = cut_width
+            leaf.children = children
+            leaf.fw_rules = None
+            for child in children:
+                # a child with a covering rule matches every packet that
+                # reaches it, so it does not need to be cut
+                if (
+                    not child.covering_fw_rules and
+                    len(child.fw_rules) > self.leaf_size
+                ):
+                    leaves.append(child)
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    fw = Firewall("500k_rules.csv")
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"HiCuts firewall time duration to add rules: {duration}")
+
+    start_time = time.time()
+    print(fw.accept_packet("inbound", "tcp", 80, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "tcp", 81, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 24, "52.12.48.92"))
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"HiCuts firewall time duration to accept packets: {duration}")
@@ -20,7 +20,7 @@ class IPAddress(object):
 
     def __init__(self, ip_address: str):
         """Constructs the tuple to represent the provided IP address."""
-        self.octets = tuple([int(octet) for octet in ip_address.split(".")])
+        self.octets = tuple(map(int, ip_address.split(".")))
 
     def __lt__(self, other: IPAddress):
         """Implements the "<" operator to compare `IPAddress` objects."""
@@ -42,11 +42,22 @@ class IPAddress(object):
 
     def __eq__(self, other: IPAddress):
         """Implements the "==" operator to compare `IPAddress` objects."""
-        for i in range(4):
-            if self.octets[i] != other.octets[i]:
-                return False
-        return True
+        return self.octets == other.octets
 
     def __hash__(self):
         """Returns the hash value of the current `IPAddress` object."""
         return hash(self.octets)
+
+    def __str__(self):
+        """Returns the IP address as four octets separated by "."s."""
+        return ".".join([str(octet) for octet in self.octets])
+
+    def to_int(self) -> int:
+        """
+        Returns the IP address as a 32-bit integer. For example, IP address
+        192.168.56.1 is returned as: 3232249857.
+        """
+        return (
+            (self.octets[0] << 24) | (self.octets[1] << 16) |
+            (self.octets[2] << 8) | self.octets[3]
+        )
@@ -0,0 +1,158 @@
+"""
+This file implements firewalls for multiple tenants, which share a base set of
+firewall rules and each add a small overlay of their own firewall rules.
+
+This program can be run in the terminal using this command:
+    python3 layered_firewall.py
+"""
+
+
+import time
+from typing import Iterable, Optional
+
+from compiled_firewall import CompiledFirewall
+from engine import FirewallEngine
+from firewall import Firewall
+from firewall_rule import FirewallRule
+
+
+# the number of buckets of an overlay, which stores a small number of rules
+OVERLAY_NUM_BUCKETS = 8
+
+
+class LayeredFirewall(FirewallEngine):
+    """
+    A data structure to represent a firewall which is a shared base firewall
+    plus an overlay of extra firewall rules.
+
+    The base firewall is referenced, not copied, so many layered firewalls can
+    share one base firewall. Firewall rules are only ever added to the
+    overlay, which is a small `Firewall` of its own, and only the overlay's
+    firewall rules can be removed. The base firewall is frozen when it is
+    shared, so adding or removing its firewall rules raises a
+    `RuntimeError`. Counting hits would change the base firewall on every
+    packet, so a base firewall which counts hits is not supported.
+
+    A packet is accepted when it matches a firewall rule of either the
+    overlay or the base firewall.
+    """
+
+    def __init__(
+        self, csv_file_path: Optional[str] = None,
+        base: Optional[Firewall] = None
+    ):
+        """
+        Initialize the firewall with the provided base firewall, and an
+        overlay with the firewall rules of the CSV file. The base firewall is
+        frozen. Raise a `ValueError` if the base firewall counts hits.
+        """
+        if base is not None and base.hit_sample_rate:
+            raise ValueError("a shared base firewall cannot count hits")
+        self.base = base if base is not None else CompiledFirewall()
+        self.base.freeze()
+        self.overlay = Firewall(num_buckets=OVERLAY_NUM_BUCKETS)
+        super().__init__(csv_file_path)
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the overlay."""
+        self.overlay.add_fw_rule(fw_rule)
+
+    def add_fw_rules(self, fw_rules: Iterable[FirewallRule]) -> None:
+        """Add the provided firewall rules to the overlay."""
+        self.overlay.add_fw_rules(fw_rules)
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the overlay. Nothing is removed
+        if the firewall rule was not added to the overlay, even if the base
+        firewall has it.
+        """
+        self.overlay.remove_fw_rule(fw_rule)
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        return (
+            self.overlay.accept_packet(direction, protocol, port, ip_address)
+            or self.base.accept_packet(direction, protocol, port, ip_address)
+        )
+
+
+class MultiTenantFirewall(object):
+    """
+    A data structure to represent the firewalls of multiple tenants.
+
+    All tenants share one base firewall, which is read from a CSV file and
+    compiled once into a `CompiledFirewall`. The base firewall is frozen
+    after it is compiled, so its firewall rules can't be changed, and it
+    does not count hits. Each
+    tenant has a `LayeredFirewall` with an overlay of the tenant's own
+    firewall rules. The memory used grows with the total number of overlay
+    firewall rules, not with the number of tenants times the number of base
+    firewall rules.
+    """
+
+    def __init__(self, csv_file_path: Optional[str] = None):
+        """
+        Initialize the base firewall by reading and storing the firewall
+        rules of the CSV file.
+        """
+        self.base = CompiledFirewall(csv_file_path)
+        self.base.freeze()
+        self.tenants = {}
+
+    def get_tenant_firewall(self, tenant: str) -> LayeredFirewall:
+        """
+        Return the firewall of the provided tenant. The tenant's firewall is
+        created if it does not exist.
+        """
+        if tenant not in self.tenants:
+            self.tenants[tenant] = LayeredFirewall(base=self.base)
+        return self.tenants[tenant]
+
+    def add_fw_rule(self, tenant: str, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the provided tenant's overlay."""
+        self.get_tenant_firewall(tenant).add_fw_rule(fw_rule)
+
+    def accept_packet(
+        self, tenant: str, direction: str, protocol: str, port: int,
+        ip_address: str
+    ) -> bool:
+        """
+        Determine whether the provided tenant's firewall can accept the
+        packet. A tenant without its own firewall rules only uses the base
+        firewall rules.
+        """
+        fw = self.tenants.get(tenant)
+        if fw is None:
+            return self.base.accept_packet(
+                direction, protocol, port, ip_address
+            )
+        return fw.accept_packet(direction, protocol, port, ip_address)
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    fw = MultiTenantFirewall("500k_rules.csv")
+    for tenant_num in range(100):
+        for port in range(1, 301):
+            fw.add_fw_rule(
+                f"tenant{tenant_num}",
+                FirewallRule("inbound", "tcp", str(port), "10.0.0.1")
+            )
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Multi-tenant firewall time duration to add rules: {duration}")
+
+    start_time = time.time()
+    print(fw.accept_packet("tenant0", "inbound", "tcp", 80, "10.0.0.1"))
+    print(fw.accept_packet("tenant0", "inbound", "tcp", 80, "192.168.1.2"))
+    print(fw.accept_packet("tenant1", "inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("tenant1", "inbound", "tcp", 81, "192.168.1.2"))
+    print(fw.accept_packet("tenant2", "inbound", "udp", 24, "52.12.48.92"))
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Multi-tenant firewall time duration to accept packets: {duration}")
@@ -6,14 +6,14 @@ This program can be run in the terminal using this command:
 """
 
 
-import csv
 import time
 from typing import Optional
 
+from engine import FirewallEngine
 from firewall_rule import FirewallRule
 
 
-class Firewall(object):
+class Firewall(FirewallEngine):
     """
     A data structure to represent a firewall. A firewall contains a list of
     firewall rules.
@@ -28,16 +28,19 @@ class Firewall(object):
         the CSV file.
         """
         self.fw_rules = set()
-        if csv_file_path:
-            with open(csv_file_path, "r") as csv_file:
-                csv_reader = csv.reader(csv_file)
-                for csv_fw_rule in csv_reader:
-                    self.add_fw_rule(FirewallRule(*csv_fw_rule))
+        super().__init__(csv_file_path)
 
     def add_fw_rule(self, fw_rule: FirewallRule) -> None:
         """Add the provided firewall rule to the data structure."""
         self.fw_rules.add(fw_rule)
 
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the data structure. Nothing is
+        removed if the firewall rule was not added.
+        """
+        self.fw_rules.discard(fw_rule)
+
     def accept_packet(
         self, direction: str, protocol: str, port: int, ip_address: str
     ) -> bool:
@@ -0,0 +1,345 @@
+"""
+This file implements a firewall whose firewall rules are split into shards.
+Each shard is stored by a `firewall.py` firewall in its own worker process.
+
+This program can be run in the terminal using this command:
+    python3 sharded_firewall.py
+"""
+
+
+import multiprocessing
+import random
+import sys
+import time
+from multiprocessing.connection import Connection
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from engine import FirewallEngine
+from firewall import Firewall
+from firewall_rule import FirewallRule
+from rand_fields import (
+    get_rand_direction, get_rand_ip_address_value, get_rand_port_value,
+    get_rand_protocol
+)
+
+
+# the index of each direction and protocol combination
+COMBINATIONS = {
+    ("inbound", "tcp"): 0,
+    ("inbound", "udp"): 1,
+    ("outbound", "tcp"): 2,
+    ("outbound", "udp"): 3,
+}
+
+# the number of firewall rules sent to a shard in a single message
+CSV_CHUNK_SIZE = 10000
+
+
+def get_max_memory_kb() -> Optional[int]:
+    """
+    Return the max resident memory of the current process in KB, or `None`
+    on platforms without the `resource` module, such as Windows. The max
+    resident memory is reported in bytes on macOS, and in KB elsewhere.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    max_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return max_memory // 1024
+    return max_memory
+
+
+def run_shard(connection: Connection) -> None:
+    """
+    Store the firewall rules of a shard, and answer the messages sent by the
+    `ShardedFirewall` on the other end of the provided connection.
+
+    Each message is a tuple of a command and its argument:
+    - ("add", rows): add the firewall rules of the rows.
+    - ("remove", rows): remove the firewall rules of the rows.
+    - ("accept", packets): reply with whether each packet is accepted.
+    - ("expire", (now, max_fw_rules)): remove the firewall rules which expired
+                                       at or before the time, and reply with
+                                       the number of removed firewall rules.
+    - ("stats", None): reply with the number of single value firewall rules,
+                       the number of bucket entries, and the max resident
+                       memory of the process in KB, which is `None` when
+                       it is not available.
+    - ("close", None): stop answering messages.
+    """
+    fw = Firewall()
+    while True:
+        command, argument = connection.recv()
+        if command == "add":
+            fw.add_fw_rules(FirewallRule(*row) for row in argument)
+        elif command == "remove":
+            for row in argument:
+                fw.remove_fw_rule(FirewallRule(*row))
+        elif command == "accept":
+            connection.send([fw.accept_packet(*packet) for packet in argument])
+        elif command == "expire":
+            connection.send(fw.remove_expired_fw_rules(*argument))
+        elif command == "stats":
+            num_bucket_entries = sum(
+                len(bucket)
+                for protocols in fw.fw_rules.values()
+                for buckets in protocols.values()
+                for bucket in buckets
+            )
+            connection.send(
+                (
+                    len(fw.exact_fw_rules), num_bucket_entries,
+                    get_max_memory_kb()
+                )
+            )
+        elif command == "close":
+            break
+    connection.close()
+
+
+class ShardedFirewall(FirewallEngine):
+    """
+    A data structure to represent a firewall whose firewall rules are split
+    across multiple worker processes.
+
+    The firewall rules are partitioned by their direction and protocol
+    combination, and by their port values. Each of the four combinations is
+    split into `num_port_ranges` equal ranges of port values, where
+    `num_port_ranges` is the smallest power of 2 which gives at least one
+    partition per shard. Partition N belongs to shard N % `num_shards`. A
+    firewall rule with a range of port values is sent to every shard that
+    owns one of the partitions it overlaps.
+
+    Each shard is a worker process, which only stores its own firewall rules
+    in a `Firewall`. This firewall is a router which forwards firewall rules
+    and packets to the owning shards over pipes. Deciding to accept a batch of
+    packets sends each shard its packets as a single message, so that all the
+    shards work on the batch at the same time.
+
+    Firewall rules with an expiry time are removed by each shard when
+    `remove_expired_fw_rules()` is called.
+
+    The firewall should be closed to stop its worker processes.
+    """
+
+    def __init__(
+        self, csv_file_path: Optional[str] = None, num_shards: int = 4
+    ):
+        """
+        Initialize the firewall by starting the worker processes, and sending
+        them the firewall rules of the CSV file.
+        """
+        self.num_shards = num_shards
+        self.num_port_ranges = 1
+        while len(COMBINATIONS) * self.num_port_ranges < num_shards:
+            self.num_port_ranges *= 2
+        self.num_ports_range = 65536 // self.num_port_ranges
+
+        # start a worker process for each shard
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        for shard_num in range(num_shards):
+            connection, shard_connection = context.Pipe()
+            process = context.Process(
+                target=run_shard, args=(shard_connection,), daemon=True
+            )
+            process.start()
+            shard_connection.close()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+        # read firewall rules from CSV file and send them to their shards
+        super().__init__(csv_file_path)
+
+    def get_shard(self, direction: str, protocol: str, port: int) -> int:
+        """Return the shard which owns the provided packet fields."""
+        partition_num = (
+            COMBINATIONS[(direction, protocol)] * self.num_port_ranges +
+            port // self.num_ports_range
+        )
+        return partition_num % self.num_shards
+
+    def get_shards(
+        self, direction: str, protocol: str, min_port: int, max_port: int
+    ) -> Set[int]:
+        """
+        Return the shards which own a firewall rule with the provided fields.
+        """
+        start_range = min_port // self.num_ports_range
+        end_range = max_port // self.num_ports_range
+        combination_num = COMBINATIONS[(direction, protocol)]
+        return {
+            (combination_num * self.num_port_ranges + range_num) %
+            self.num_shards
+            for range_num in range(start_range, end_range + 1)
+        }
+
+    def get_fw_rule_shards(self, fw_rule: FirewallRule) -> Set[int]:
+        """Return the shards which own the provided firewall rule."""
+        return self.get_shards(
+            fw_rule.direction, fw_rule.protocol, fw_rule.min_port,
+            fw_rule.max_port
+        )
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Send the provided firewall rule to the shards which own it."""
+        row = fw_rule.get_fields() + (fw_rule.expires_at,)
+        for shard_num in self.get_fw_rule_shards(fw_rule):
+            self.connections[shard_num].send(("add", [row]))
+
+    def add_fw_rules(self, fw_rules: Iterable[FirewallRule]) -> None:
+        """
+        Send the provided firewall rules to the shards which own them. The
+        firewall rules of each shard are sent in chunks of `CSV_CHUNK_SIZE`
+        firewall rules.
+        """
+        shard_rows = [[] for i in range(self.num_shards)]
+        for fw_rule in fw_rules:
+            row = fw_rule.get_fields() + (fw_rule.expires_at,)
+            for shard_num in self.get_fw_rule_shards(fw_rule):
+                shard_rows[shard_num].append(row)
+                if len(shard_rows[shard_num]) == CSV_CHUNK_SIZE:
+                    self.connections[shard_num].send(
+                        ("add", shard_rows[shard_num])
+                    )
+                    shard_rows[shard_num] = []
+        for shard_num, rows in enumerate(shard_rows):
+            if rows:
+                self.connections[shard_num].send(("add", rows))
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the shards which own it.
+        """
+        row = fw_rule.get_fields()
+        for shard_num in self.get_fw_rule_shards(fw_rule):
+            self.connections[shard_num].send(("remove", [row]))
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        shard_num = self.get_shard(direction, protocol, port)
+        connection = self.connections[shard_num]
+        connection.send(("accept", [(direction, protocol, port, ip_address)]))
+        return connection.recv()[0]
+
+    def accept_packets(
+        self, packets: List[Tuple[str, str, int, str]]
+    ) -> List[bool]:
+        """
+        Determine whether the firewall can accept each of the provided
+        packets. Each packet is a tuple of: direction, protocol, port, and IP
+        address.
+        """
+        shard_packets = {}
+        shard_indexes = {}
+        for index, packet in enumerate(packets):
+            shard_num = self.get_shard(*packet[:3])
+            if shard_num not in shard_packets:
+                shard_packets[shard_num] = []
+                shard_indexes[shard_num] = []
+            shard_packets[shard_num].append(packet)
+            shard_indexes[shard_num].append(index)
+
+        # send every shard its packets before waiting for any of the replies
+        for shard_num, curr_packets in shard_packets.items():
+            self.connections[shard_num].send(("accept", curr_packets))
+        results = [False] * len(packets)
+        for shard_num, indexes in shard_indexes.items():
+            for index, result in zip(
+                indexes, self.connections[shard_num].recv()
+            ):
+                results[index] = result
+        return results
+
+    def remove_expired_fw_rules(
+        self, now: Optional[float] = None,
+        max_fw_rules: Optional[int] = None
+    ) -> int:
+        """
+        Remove the firewall rules whose expiry time is at or before the
+        provided time, which is the current time by default, from every
+        shard. At most `max_fw_rules` firewall rules are removed from each
+        shard when it is provided. Return the number of firewall rules which
+        were removed, where a firewall rule split across shards is counted
+        once for each shard.
+        """
+        if now is None:
+            now = time.time()
+        for connection in self.connections:
+            connection.send(("expire", (now, max_fw_rules)))
+        return sum(connection.recv() for connection in self.connections)
+
+    def get_shard_stats(self) -> List[Dict[str, int]]:
+        """
+        Return the number of single value firewall rules, the number of bucket
+        entries, and the max resident memory in KB of each shard. The max
+        resident memory is `None` on platforms which don't report it.
+        """
+        for connection in self.connections:
+            connection.send(("stats", None))
+        shard_stats = []
+        for connection in self.connections:
+            num_exact_fw_rules, num_bucket_entries, max_memory = (
+                connection.recv()
+            )
+            shard_stats.append({
+                "num_exact_fw_rules": num_exact_fw_rules,
+                "num_bucket_entries": num_bucket_entries,
+                "max_memory_kb": max_memory,
+            })
+        return shard_stats
+
+    def close(self) -> None:
+        """Stop the worker processes."""
+        for connection in self.connections:
+            connection.send(("close", None))
+            connection.close()
+        for process in self.processes:
+            process.join()
+        self.connections = []
+        self.processes = []
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    packets = [
+        (
+            get_rand_direction(), get_rand_protocol(),
+            int(get_rand_port_value()), get_rand_ip_address_value()
+        )
+        for i in range(100000)
+    ]
+    for num_shards in (1, 2, 4, 8):
+        start_time = time.time()
+        fw = ShardedFirewall("500k_rules.csv", num_shards=num_shards)
+        shard_stats = fw.get_shard_stats()
+        end_time = time.time()
+        duration = end_time - start_time
+        print(f"{num_shards} shards time duration to add rules: {duration}")
+        if shard_stats[0]["max_memory_kb"] is not None:
+            max_memory = max(stats["max_memory_kb"] for stats in shard_stats)
+            print(
+                f"{num_shards} shards max memory per process (KB): "
+                f"{max_memory}"
+            )
+
+        start_time = time.time()
+        fw.accept_packets(packets)
+        end_time = time.time()
+        throughput = len(packets) / (end_time - start_time)
+        print(f"{num_shards} shards batch packets per second: {throughput}")
+
+        start_time = time.time()
+        for packet in packets[:10000]:
+            fw.accept_packet(*packet)
+        end_time = time.time()
+        throughput = 10000 / (end_time - start_time)
+        print(f"{num_shards} shards single packets per second: {throughput}")
+        fw.close()
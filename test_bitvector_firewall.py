@@ -0,0 +1,106 @@
+"""
+Unit tests to check functionality of bitvector_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_bitvector_firewall.py
+"""
+
+
+import unittest
+
+from bitvector_firewall import Firewall, build_bitsets
+from firewall_rule import FirewallRule
+
+
+class TestBitVectorFirewall(unittest.TestCase):
+    def test_build_bitsets(self):
+        """Verify that ranges are split into elementary intervals."""
+        points, bitsets = build_bitsets([(10, 20), (15, 30), (21, 30)])
+        self.assertEqual(points, [0, 10, 15, 21, 31])
+        self.assertEqual(bitsets, [0b000, 0b001, 0b011, 0b110, 0b000])
+
+    def test_no_add_duplicate_rules(self):
+        """Verify that duplicate rules cannot be added."""
+        fw = Firewall()
+        for i in range(2):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="80",
+                    ip_address="192.168.1.2"
+                )
+            )
+        self.assertEqual(len(fw.fw_rules["inbound"]["tcp"].fw_rules), 1)
+
+    def test_first_match(self):
+        """Verify that the first added matching rule is returned."""
+        fw = Firewall()
+        fw_rules = [
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80-90",
+                ip_address="192.168.1.2"
+            ),
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="85",
+                ip_address="192.168.1.1-192.168.1.3"
+            ),
+        ]
+        for fw_rule in fw_rules:
+            fw.add_fw_rule(fw_rule)
+        self.assertEqual(
+            fw.get_first_match(
+                direction="inbound", protocol="tcp", port=85,
+                ip_address="192.168.1.2"
+            ),
+            fw_rules[0]
+        )
+        self.assertEqual(
+            fw.get_first_match(
+                direction="inbound", protocol="tcp", port=85,
+                ip_address="192.168.1.3"
+            ),
+            fw_rules[1]
+        )
+        self.assertIsNone(
+            fw.get_first_match(
+                direction="inbound", protocol="tcp", port=91,
+                ip_address="192.168.1.2"
+            )
+        )
+
+    def test_remove_rule(self):
+        """Verify that a removed rule no longer matches packets."""
+        fw = Firewall()
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80-90",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(fw_rule)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="85",
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+        fw.remove_fw_rule(fw_rule)
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=85,
+                ip_address="192.168.1.2"
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
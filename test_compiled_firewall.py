@@ -0,0 +1,253 @@
+"""
+Unit tests to check functionality of compiled_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_compiled_firewall.py
+"""
+
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from compiled_firewall import (
+    CACHE_FILE_EXTENSION, CompiledFirewall, MAX_IP, MAX_PORT, MIN_IP,
+    MIN_PORT, generate_tree, get_staircase
+)
+from firewall_rule import FirewallRule
+
+
+class TestCompiledFirewall(unittest.TestCase):
+    def test_staircase(self):
+        """Verify that dominated limits are not part of the staircase."""
+        fw_rule_bounds = [(0, 10, 0, 5), (0, 5, 0, 10), (0, 4, 0, 4)]
+        self.assertEqual(
+            get_staircase(fw_rule_bounds, MAX_PORT, MAX_IP),
+            [(10, 5), (5, 10)]
+        )
+        self.assertEqual(
+            get_staircase(fw_rule_bounds, MIN_PORT, MIN_IP), [(0, 0)]
+        )
+
+    def test_generated_tree(self):
+        """
+        Verify that the generated if-tree matches the same points as a linear
+        check of the firewall rule bounds.
+        """
+        random.seed(0)
+        fw_rule_bounds = []
+        for i in range(100):
+            min_port = random.randint(0, 90)
+            min_ip = random.randint(0, 90)
+            fw_rule_bounds.append((
+                min_port, min_port + random.randint(0, 10),
+                min_ip, min_ip + random.randint(0, 10)
+            ))
+        lines = ["def accept(port, ip):"]
+        generate_tree(fw_rule_bounds, "    ", lines)
+        lines.append("    return False")
+        namespace = {}
+        exec("\n".join(lines), namespace)
+        for port in range(101):
+            for ip in range(101):
+                self.assertEqual(
+                    namespace["accept"](port, ip),
+                    any(
+                        bounds[MIN_PORT] <= port <= bounds[MAX_PORT] and
+                        bounds[MIN_IP] <= ip <= bounds[MAX_IP]
+                        for bounds in fw_rule_bounds
+                    )
+                )
+
+    def test_firewall_allow_and_block_packets(self):
+        """
+        Verify firewall allows packets that match a rule, and blocks packets
+        that don't.
+        """
+        fw = CompiledFirewall("sample_rules.csv", use_cache=False)
+        self.assertIsNotNone(fw.compiled_functions)
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="outbound", protocol="udp", port=1500,
+                ip_address="52.12.48.92"
+            )
+        )
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=81,
+                ip_address="192.168.1.2"
+            )
+        )
+
+    def test_range_rule_invalidates_compiled_functions(self):
+        """
+        Verify that adding or removing a rule with a range of values falls
+        back to the buckets until the firewall is compiled again.
+        """
+        fw = CompiledFirewall("sample_rules.csv", use_cache=False)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
+                ip_address="10.0.0.1"
+            )
+        )
+        self.assertIsNotNone(fw.compiled_functions)
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="1-100",
+            ip_address="10.0.0.1-10.0.0.5"
+        )
+        fw.add_fw_rule(fw_rule)
+        self.assertIsNone(fw.compiled_functions)
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=50,
+                ip_address="10.0.0.3"
+            )
+        )
+        fw.compile_fw_rules()
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=50,
+                ip_address="10.0.0.3"
+            )
+        )
+        fw.remove_fw_rule(fw_rule)
+        self.assertIsNone(fw.compiled_functions)
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=50,
+                ip_address="10.0.0.3"
+            )
+        )
+
+    def test_cache_file(self):
+        """
+        Verify that the compiled code is written to a cache file alongside
+        the CSV file, and is loaded from it instead of being compiled again.
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            shutil.copyfile("sample_rules.csv", csv_file_path)
+            cache_file_path = csv_file_path + CACHE_FILE_EXTENSION
+            CompiledFirewall(csv_file_path)
+            self.assertTrue(os.path.exists(cache_file_path))
+            modified_time = os.path.getmtime(cache_file_path)
+
+            fw = CompiledFirewall(csv_file_path)
+            self.assertEqual(os.path.getmtime(cache_file_path), modified_time)
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="outbound", protocol="udp", port=1500,
+                    ip_address="52.12.48.92"
+                )
+            )
+
+            # a cache file of different rules is replaced
+            with open(csv_file_path, "a") as csv_file:
+                csv_file.write("inbound,tcp,1-100,10.0.0.1-10.0.0.5\n")
+            with open(cache_file_path, "rb") as cache_file:
+                cache = cache_file.read()
+            fw = CompiledFirewall(csv_file_path)
+            with open(cache_file_path, "rb") as cache_file:
+                self.assertNotEqual(cache_file.read(), cache)
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=50,
+                    ip_address="10.0.0.3"
+                )
+            )
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_cache_file_skips_generating_source(self):
+        """
+        Verify that the source code is not generated again when the cache
+        file is loaded.
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            shutil.copyfile("sample_rules.csv", csv_file_path)
+            CompiledFirewall(csv_file_path)
+            with mock.patch.object(
+                CompiledFirewall, "generate_source",
+                side_effect=AssertionError("source generated")
+            ):
+                fw = CompiledFirewall(csv_file_path)
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="outbound", protocol="udp", port=1500,
+                    ip_address="52.12.48.92"
+                )
+            )
+            # only the cache file is left, without any temporary files
+            self.assertEqual(
+                sorted(os.listdir(temp_dir)),
+                ["rules.csv", "rules.csv" + CACHE_FILE_EXTENSION]
+            )
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_truncated_cache_file(self):
+        """
+        Verify that a truncated cache file, such as one left by a crash while
+        it was written, is compiled again and replaced.
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            shutil.copyfile("sample_rules.csv", csv_file_path)
+            cache_file_path = csv_file_path + CACHE_FILE_EXTENSION
+            CompiledFirewall(csv_file_path)
+            with open(cache_file_path, "rb") as cache_file:
+                cache = cache_file.read()
+            with open(cache_file_path, "wb") as cache_file:
+                cache_file.write(cache[:60])
+
+            fw = CompiledFirewall(csv_file_path)
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="outbound", protocol="udp", port=1500,
+                    ip_address="52.12.48.92"
+                )
+            )
+            with open(cache_file_path, "rb") as cache_file:
+                self.assertEqual(cache_file.read(), cache)
+        finally:
+            shutil.rmtree(temp_dir)
+
+    def test_cache_file_not_writable(self):
+        """
+        Verify that the firewall is compiled without a cache file when the
+        cache file cannot be read or written.
+        """
+        temp_dir = tempfile.mkdtemp()
+        try:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            shutil.copyfile("sample_rules.csv", csv_file_path)
+            # a directory in place of the cache file can't be opened
+            os.mkdir(csv_file_path + CACHE_FILE_EXTENSION)
+            fw = CompiledFirewall(csv_file_path)
+            self.assertIsNotNone(fw.compiled_functions)
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="outbound", protocol="udp", port=1500,
+                    ip_address="52.12.48.92"
+                )
+            )
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+"""
+Unit tests to check that every firewall engine of engine.py behaves the same.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_engines.py
+"""
+
+
+import csv
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from typing import List, Optional, Tuple
+
+import firewall
+from engine import ENGINES, FirewallEngine, get_engine, register_engine
+from firewall_rule import FirewallRule
+from rand_fields import (
+    get_rand_direction, get_rand_ip_address_value, get_rand_port_value,
+    get_rand_protocol, get_rand_rule
+)
+
+
+# the extra constructor arguments of the engines which need them
+ENGINE_KWARGS = {
+    "sharded_firewall": {"num_shards": 2},
+}
+
+
+class TestEngines(unittest.TestCase):
+    def create_firewall(
+        self, name: str, csv_file_path: Optional[str] = None
+    ) -> FirewallEngine:
+        """
+        Return a firewall of the provided engine with the firewall rules of
+        the CSV file. The firewall is closed when the test finishes.
+        """
+        fw = get_engine(name)(csv_file_path, **ENGINE_KWARGS.get(name, {}))
+        self.addCleanup(fw.close)
+        return fw
+
+    def get_firewalls(
+        self, fw_rules: List[FirewallRule]
+    ) -> List[Tuple[str, FirewallEngine]]:
+        """
+        Return a (name, firewall) tuple of each registered engine, with the
+        provided firewall rules added one at a time.
+        """
+        firewalls = []
+        for name in ENGINES:
+            fw = self.create_firewall(name)
+            for fw_rule in fw_rules:
+                fw.add_fw_rule(fw_rule)
+            firewalls.append((name, fw))
+        return firewalls
+
+    def test_registry(self):
+        """Verify that engines are chosen by name, and can be registered."""
+        self.assertIs(get_engine("firewall"), firewall.Firewall)
+        for name in ENGINES:
+            self.assertTrue(issubclass(get_engine(name), FirewallEngine))
+        with self.assertRaises(KeyError):
+            get_engine("unknown_firewall")
+        register_engine("organized_firewall", "firewall", "Firewall")
+        try:
+            self.assertIs(get_engine("organized_firewall"), firewall.Firewall)
+        finally:
+            del ENGINES["organized_firewall"]
+
+    def test_missing_method(self):
+        """
+        Verify that an engine which does not implement every abstract method
+        can't be created.
+        """
+        class IncompleteFirewall(FirewallEngine):
+            def add_fw_rule(self, fw_rule):
+                pass
+
+            def accept_packet(self, direction, protocol, port, ip_address):
+                return False
+
+        with self.assertRaises(TypeError):
+            IncompleteFirewall()
+
+    def test_firewall_allow_packet(self):
+        """Verify firewall allows a packet that matches a rule."""
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="192.168.1.2"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertTrue(
+                    fw.accept_packet(
+                        direction="inbound", protocol="tcp", port=80,
+                        ip_address="192.168.1.2"
+                    )
+                )
+
+    def test_firewall_block_packet(self):
+        """Verify firewall blocks a packet that doesn't match a rule."""
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="192.168.1.2"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertEqual(
+                    fw.accept_packets([
+                        ("outbound", "tcp", 80, "192.168.1.2"),
+                        ("inbound", "udp", 80, "192.168.1.2"),
+                        ("inbound", "udp", 81, "192.168.1.2"),
+                        ("outbound", "tcp", 80, "192.168.1.3"),
+                    ]),
+                    [False, False, False, False]
+                )
+
+    def test_firewall_allow_range_port_packet(self):
+        """
+        Verify firewall allows a packet that matches a rule with ranged port
+        numbers.
+        """
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="1-65535",
+                ip_address="192.168.1.2"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertEqual(
+                    fw.accept_packets([
+                        ("inbound", "tcp", 1, "192.168.1.2"),
+                        ("inbound", "tcp", 65535, "192.168.1.2"),
+                        ("inbound", "tcp", 30000, "192.168.1.2"),
+                    ]),
+                    [True, True, True]
+                )
+
+    def test_firewall_block_range_port_packet(self):
+        """
+        Verify firewall blocks a packet that doesn't match a rule with ranged
+        port numbers.
+        """
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80-90",
+                ip_address="192.168.1.2"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertEqual(
+                    fw.accept_packets([
+                        ("inbound", "tcp", 79, "192.168.1.2"),
+                        ("inbound", "tcp", 91, "192.168.1.2"),
+                    ]),
+                    [False, False]
+                )
+
+    def test_firewall_allow_range_ipaddr_packet(self):
+        """
+        Verify firewall allows a packet that matches a rule with ranged IP
+        addresses.
+        """
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="0.0.0.0-255.255.255.255"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertEqual(
+                    fw.accept_packets([
+                        ("inbound", "tcp", 80, "0.0.0.0"),
+                        ("inbound", "tcp", 80, "255.255.255.255"),
+                        ("inbound", "tcp", 80, "192.168.1.2"),
+                    ]),
+                    [True, True, True]
+                )
+
+    def test_firewall_block_range_ipaddr_packet(self):
+        """
+        Verify firewall blocks a packet that doesn't match a rule with ranged
+        IP addresses.
+        """
+        for name, fw in self.get_firewalls([
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="192.168.1.2-192.168.2.1"
+            )
+        ]):
+            with self.subTest(engine=name):
+                self.assertEqual(
+                    fw.accept_packets([
+                        ("inbound", "tcp", 80, "192.168.1.1"),
+                        ("inbound", "tcp", 91, "192.168.2.2"),
+                    ]),
+                    [False, False]
+                )
+
+    def test_remove_rule(self):
+        """
+        Verify that removed rules no longer match packets, and that removing
+        a rule which was not added does nothing.
+        """
+        fw_rules = [
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="192.168.1.2"
+            ),
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="50-2000",
+                ip_address="192.168.1.3-192.168.1.9"
+            ),
+        ]
+        packets = [
+            ("inbound", "tcp", 80, "192.168.1.2"),
+            ("inbound", "tcp", 1500, "192.168.1.5"),
+        ]
+        for name, fw in self.get_firewalls(fw_rules):
+            with self.subTest(engine=name):
+                fw.remove_fw_rule(
+                    FirewallRule(
+                        direction="outbound", protocol="udp", port="53",
+                        ip_address="10.0.0.1"
+                    )
+                )
+                self.assertEqual(fw.accept_packets(packets), [True, True])
+                fw.remove_fw_rule(fw_rules[1])
+                self.assertEqual(fw.accept_packets(packets), [True, False])
+                fw.remove_fw_rule(fw_rules[0])
+                self.assertEqual(fw.accept_packets(packets), [False, False])
+
+    def test_load_csv(self):
+        """Verify that every engine loads the rules of a CSV file."""
+        packets = [
+            ("inbound", "tcp", 80, "192.168.1.2"),
+            ("outbound", "tcp", 15000, "192.168.10.11"),
+            ("inbound", "udp", 53, "192.168.1.200"),
+            ("outbound", "udp", 1500, "52.12.48.92"),
+            ("inbound", "tcp", 81, "192.168.1.2"),
+            ("inbound", "udp", 24, "52.12.48.92"),
+        ]
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            # the compiled firewall writes its cache file next to the copy
+            shutil.copyfile("sample_rules.csv", csv_file_path)
+            for name in ENGINES:
+                with self.subTest(engine=name):
+                    fw = self.create_firewall(name, csv_file_path)
+                    self.assertEqual(
+                        fw.accept_packets(packets),
+                        [True, True, True, True, False, False]
+                    )
+
+    def test_same_as_naive_firewall(self):
+        """
+        Verify that every engine accepts the same random packets as the naive
+        firewall, after loading random rules from a CSV file, adding more
+        rules, and removing some rules.
+        """
+        for seed in range(3):
+            random.seed(seed)
+            csv_fw_rules = [get_rand_rule() for i in range(100)]
+            added_fw_rules = [
+                FirewallRule(*get_rand_rule()) for i in range(20)
+            ]
+            removed_fw_rules = [
+                FirewallRule(*csv_fw_rule)
+                for csv_fw_rule in random.sample(csv_fw_rules, 20)
+            ] + added_fw_rules[:5]
+            packets = []
+            for i in range(500):
+                direction, protocol, port, ip_address = random.choice(
+                    csv_fw_rules
+                )
+                packets.append((
+                    direction, protocol, int(port.split("-")[-1]),
+                    ip_address.split("-")[0]
+                ))
+                packets.append((
+                    get_rand_direction(), get_rand_protocol(),
+                    int(get_rand_port_value()), get_rand_ip_address_value()
+                ))
+
+            with tempfile.TemporaryDirectory() as temp_dir:
+                csv_file_path = os.path.join(temp_dir, "rules.csv")
+                with open(csv_file_path, "w", newline="") as csv_file:
+                    csv.writer(csv_file).writerows(csv_fw_rules)
+                results = {}
+                for name in ENGINES:
+                    fw = self.create_firewall(name, csv_file_path)
+                    results[name] = [fw.accept_packets(packets)]
+                    for fw_rule in added_fw_rules:
+                        fw.add_fw_rule(fw_rule)
+                    results[name].append(fw.accept_packets(packets))
+                    for fw_rule in removed_fw_rules:
+                        fw.remove_fw_rule(fw_rule)
+                    results[name].append(fw.accept_packets(packets))
+
+            for name in ENGINES:
+                with self.subTest(engine=name, seed=seed):
+                    self.assertEqual(results[name], results["naive_firewall"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,10 +6,20 @@ These unit tests can be run in the terminal using this command:
 """
 
 
+import csv
+import gc
+import os
+import pickle
+import random
+import subprocess
+import sys
+import tempfile
 import unittest
 
-from firewall import Firewall
+from firewall import Firewall, get_ip_range
 from firewall_rule import FirewallRule
+from ip_address import IPAddress
+from rand_fields import get_rand_rule
 
 
 class TestFirewall(unittest.TestCase):
@@ -22,15 +32,30 @@ class TestFirewall(unittest.TestCase):
                 ip_address="192.168.1.2"
             )
         )
-        bucket_num = 80 // fw.num_ports_bucket
-        self.assertEqual(len(fw.fw_rules["inbound"]["tcp"][bucket_num]), 1)
+        self.assertEqual(len(fw.exact_fw_rules), 1)
         fw.add_fw_rule(
             FirewallRule(
                 direction="inbound", protocol="tcp", port="80",
                 ip_address="192.168.1.2"
             )
         )
-        self.assertEqual(len(fw.fw_rules["inbound"]["tcp"][bucket_num]), 1)
+        self.assertEqual(len(fw.exact_fw_rules), 1)
+
+    def test_single_value_rule_not_in_buckets(self):
+        """
+        Verify that a rule with a single port value and a single IP address
+        is only stored in the hash-map of single value rules.
+        """
+        fw = Firewall()
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(fw_rule)
+        key = ("inbound", "tcp", 80, IPAddress("192.168.1.2").to_int())
+        self.assertEqual(fw.exact_fw_rules, {key: fw_rule})
+        bucket_num = 80 // fw.num_ports_bucket
+        self.assertEqual(len(fw.fw_rules["inbound"]["tcp"][bucket_num]), 0)
 
     def test_no_add_duplicate_range_port_rules(self):
         """Verify that duplicate range port rules cannot be added."""
@@ -73,168 +98,526 @@ class TestFirewall(unittest.TestCase):
         )
         self.assertEqual(len(fw.fw_rules["inbound"]["tcp"][bucket_num]), 1)
 
-    def test_firewall_allow_packet(self):
-        """Verify firewall allows a packet that matches a rule."""
+    def test_add_fw_rules(self):
+        """
+        Verify that adding rules in bulk stores them in the same buckets as
+        adding them one at a time.
+        """
+        random.seed(0)
+        fw_rules = [FirewallRule(*get_rand_rule()) for i in range(200)]
         fw = Firewall()
-        fw.add_fw_rule(
+        for fw_rule in fw_rules:
+            fw.add_fw_rule(fw_rule)
+        bulk_fw = Firewall()
+        bulk_fw.add_fw_rules(fw_rules[:100])
+        bulk_fw.add_fw_rules(fw_rules[100:] + fw_rules[:10])
+        self.assertEqual(bulk_fw.fw_rules, fw.fw_rules)
+        self.assertEqual(bulk_fw.exact_fw_rules, fw.exact_fw_rules)
+
+    def test_add_fw_rules_restores_gc(self):
+        """
+        Verify that the garbage collector is enabled again after adding rules
+        in bulk, unless it was already disabled.
+        """
+        fw_rules = [
             FirewallRule(
-                direction="inbound", protocol="tcp", port="80",
-                ip_address="192.168.1.2"
-            )
-        )
-        self.assertTrue(
-            fw.accept_packet(
-                direction="inbound", protocol="tcp", port=80,
+                direction="inbound", protocol="tcp", port="80-90",
                 ip_address="192.168.1.2"
             )
+        ]
+        Firewall().add_fw_rules(fw_rules)
+        self.assertTrue(gc.isenabled())
+        gc.disable()
+        try:
+            Firewall().add_fw_rules(fw_rules)
+            self.assertFalse(gc.isenabled())
+        finally:
+            gc.enable()
+
+    def test_no_add_duplicate_csv_rules(self):
+        """Verify that duplicate rules of a CSV file are not added."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            with open(csv_file_path, "w", newline="") as csv_file:
+                csv_writer = csv.writer(csv_file)
+                for i in range(2):
+                    csv_writer.writerow(("inbound", "tcp", "80", "10.0.0.1"))
+                    csv_writer.writerow(
+                        ("inbound", "tcp", "50-2000", "10.0.0.1-10.0.0.2")
+                    )
+            fw = Firewall(csv_file_path)
+        self.assertEqual(len(fw.exact_fw_rules), 1)
+        start_bucket = 50 // fw.num_ports_bucket
+        end_bucket = 2000 // fw.num_ports_bucket
+        for bucket_num in range(start_bucket, end_bucket + 1):
+            self.assertEqual(len(fw.fw_rules["inbound"]["tcp"][bucket_num]), 1)
+        self.assertEqual(
+            len(fw.fw_rules["inbound"]["tcp"][end_bucket + 1]), 0
         )
 
-    def test_firewall_block_packet(self):
-        """Verify firewall blocks a packet that doesn't match a rule."""
+    def test_remove_rule(self):
+        """Verify that removed rules no longer match packets."""
         fw = Firewall()
-        fw.add_fw_rule(
+        fw_rules = [
             FirewallRule(
                 direction="inbound", protocol="tcp", port="80",
                 ip_address="192.168.1.2"
-            )
-        )
-        self.assertFalse(
-            fw.accept_packet(
-                direction="outbound", protocol="tcp", port=80,
-                ip_address="192.168.1.2"
-            )
-        )
-        self.assertFalse(
-            fw.accept_packet(
-                direction="inbound", protocol="udp", port=80,
-                ip_address="192.168.1.2"
-            )
-        )
+            ),
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="50-2000",
+                ip_address="192.168.1.3"
+            ),
+        ]
+        fw.add_fw_rules(fw_rules)
+        for fw_rule in fw_rules:
+            fw.remove_fw_rule(fw_rule)
+        self.assertEqual(len(fw.exact_fw_rules), 0)
+        self.assertEqual(len(fw.exact_port_fw_rules), 0)
+        for bucket in fw.fw_rules["inbound"]["tcp"]:
+            self.assertEqual(len(bucket), 0)
         self.assertFalse(
             fw.accept_packet(
-                direction="inbound", protocol="udp", port=81,
+                direction="inbound", protocol="tcp", port=80,
                 ip_address="192.168.1.2"
             )
         )
         self.assertFalse(
             fw.accept_packet(
-                direction="outbound", protocol="tcp", port=80,
+                direction="inbound", protocol="tcp", port=80,
                 ip_address="192.168.1.3"
             )
         )
 
-    def test_firewall_allow_range_port_packet(self):
+    def test_remove_expired_rules(self):
         """
-        Verify firewall allows a packet that matches a rule with ranged port
-        numbers.
+        Verify that only expired rules are removed, and that at most the
+        provided number of rules are removed at a time.
         """
         fw = Firewall()
+        for port in range(80, 90):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port=str(port),
+                    ip_address="192.168.1.2", expires_at=port
+                )
+            )
         fw.add_fw_rule(
             FirewallRule(
-                direction="inbound", protocol="tcp", port="1-65535",
+                direction="inbound", protocol="tcp", port="1000-2000",
+                ip_address="192.168.1.2-192.168.1.3", expires_at=100
+            )
+        )
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
                 ip_address="192.168.1.2"
             )
         )
+        self.assertEqual(fw.remove_expired_fw_rules(now=79), 0)
+        self.assertEqual(fw.remove_expired_fw_rules(now=99, max_fw_rules=4), 4)
+        self.assertEqual(fw.remove_expired_fw_rules(now=99), 6)
         self.assertTrue(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=1,
-                ip_address="192.168.1.2"
+                direction="inbound", protocol="tcp", port=1500,
+                ip_address="192.168.1.3"
             )
         )
-        self.assertTrue(
+        self.assertEqual(fw.remove_expired_fw_rules(now=100), 1)
+        for port in range(80, 90):
+            self.assertFalse(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=port,
+                    ip_address="192.168.1.2"
+                )
+            )
+        self.assertFalse(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=65535,
-                ip_address="192.168.1.2"
+                direction="inbound", protocol="tcp", port=1500,
+                ip_address="192.168.1.3"
             )
         )
         self.assertTrue(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=30000,
+                direction="inbound", protocol="tcp", port=22,
                 ip_address="192.168.1.2"
             )
         )
 
-    def test_firewall_block_range_port_packet(self):
+    def test_readd_rule_replaces_expiry(self):
         """
-        Verify firewall blocks a packet that doesn't match a rule with ranged
-        port numbers.
+        Verify that adding a rule again replaces its expiry time, and that
+        adding it without an expiry time keeps it.
         """
         fw = Firewall()
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80-90",
+                ip_address="192.168.1.2", expires_at=100
+            )
+        )
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80-90",
+                ip_address="192.168.1.2", expires_at=200
+            )
+        )
+        self.assertEqual(fw.remove_expired_fw_rules(now=150), 0)
         fw.add_fw_rule(
             FirewallRule(
                 direction="inbound", protocol="tcp", port="80-90",
                 ip_address="192.168.1.2"
             )
         )
-        self.assertFalse(
+        self.assertEqual(fw.remove_expired_fw_rules(now=300), 0)
+        self.assertTrue(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=79,
+                direction="inbound", protocol="tcp", port=85,
                 ip_address="192.168.1.2"
             )
         )
+
+    def test_csv_expiry(self):
+        """Verify that expiry times are read from a fifth CSV column."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_file_path = os.path.join(temp_dir, "rules.csv")
+            with open(csv_file_path, "w", newline="") as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerow(("inbound", "tcp", "80", "10.0.0.1", "50"))
+                csv_writer.writerow(("inbound", "tcp", "81", "10.0.0.1"))
+            fw = Firewall(csv_file_path)
+        self.assertEqual(fw.remove_expired_fw_rules(now=50), 1)
         self.assertFalse(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=91,
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="10.0.0.1"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=81,
+                ip_address="10.0.0.1"
+            )
+        )
+
+    def test_hit_counts(self):
+        """
+        Verify that sampled hits are counted, and that rules which never
+        match have a count of 0.
+        """
+        fw = Firewall(hit_sample_rate=2)
+        hot_fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80-90",
+            ip_address="192.168.1.2"
+        )
+        dead_fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="22",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(hot_fw_rule)
+        fw.add_fw_rule(dead_fw_rule)
+        for i in range(10):
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=85,
                 ip_address="192.168.1.2"
             )
+        self.assertEqual(
+            fw.get_hit_counts(), {hot_fw_rule: 5, dead_fw_rule: 0}
+        )
+        self.assertEqual(
+            fw.hit_buckets, {("inbound", "tcp", 0): {hot_fw_rule}}
         )
 
-    def test_firewall_allow_range_ipaddr_packet(self):
+    def test_single_value_hit_not_in_hit_buckets(self):
         """
-        Verify firewall allows a packet that matches a rule with ranged IP
-        addresses.
+        Verify that a hit on a single value rule does not mark its port's
+        bucket to be reordered, because the rule is not in the bucket.
         """
+        fw = Firewall(hit_sample_rate=1)
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="22",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(fw_rule)
+        fw.accept_packet(
+            direction="inbound", protocol="tcp", port=22,
+            ip_address="192.168.1.2"
+        )
+        self.assertEqual(fw.get_hit_counts(), {fw_rule: 1})
+        self.assertEqual(fw.hit_buckets, {})
+
+    def test_no_hit_counts_by_default(self):
+        """Verify that hits are not counted by default."""
         fw = Firewall()
         fw.add_fw_rule(
             FirewallRule(
                 direction="inbound", protocol="tcp", port="80",
-                ip_address="0.0.0.0-255.255.255.255"
+                ip_address="192.168.1.2"
             )
         )
+        fw.accept_packet(
+            direction="inbound", protocol="tcp", port=80,
+            ip_address="192.168.1.2"
+        )
+        self.assertEqual(len(fw.hit_counts), 0)
+
+    def test_reorder_buckets(self):
+        """
+        Verify that the rules of a bucket which had hits are checked first,
+        and that the rules without hits are not sorted.
+        """
+        fw = Firewall(hit_sample_rate=1, reorder_interval=10)
+        for port in range(80, 90):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port=f"{port}-90",
+                    ip_address="192.168.1.2-192.168.1.3"
+                )
+            )
+        hot_fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="90-100",
+            ip_address="192.168.1.2-192.168.1.3"
+        )
+        fw.add_fw_rule(hot_fw_rule)
+        for i in range(10):
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=95,
+                ip_address="192.168.1.2"
+            )
+        bucket_num = 95 // fw.num_ports_bucket
+        ordered_fw_rules = fw.ordered_fw_rules["inbound"]["tcp"][bucket_num]
+        self.assertEqual(ordered_fw_rules, (hot_fw_rule,))
         self.assertTrue(
             fw.accept_packet(
                 direction="inbound", protocol="tcp", port=80,
-                ip_address="0.0.0.0"
+                ip_address="192.168.1.3"
+            )
+        )
+
+        # an added rule is checked after the hottest rules
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="101-102",
+                ip_address="192.168.1.2-192.168.1.3"
             )
         )
+        self.assertEqual(ordered_fw_rules, (hot_fw_rule,))
         self.assertTrue(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=80,
-                ip_address="255.255.255.255"
+                direction="inbound", protocol="tcp", port=101,
+                ip_address="192.168.1.2"
             )
         )
-        self.assertTrue(
+
+        # a removed rule is no longer one of the hottest rules
+        fw.remove_fw_rule(hot_fw_rule)
+        self.assertEqual(
+            fw.ordered_fw_rules["inbound"]["tcp"][bucket_num], ()
+        )
+        self.assertFalse(
             fw.accept_packet(
-                direction="inbound", protocol="tcp", port=80,
+                direction="inbound", protocol="tcp", port=95,
                 ip_address="192.168.1.2"
             )
         )
 
-    def test_firewall_block_range_ipaddr_packet(self):
+    def test_removed_rule_not_reordered(self):
         """
-        Verify firewall blocks a packet that doesn't match a rule with ranged
-        IP addresses.
+        Verify that a rule which is removed after a hit is not added back to
+        its bucket by the next reorder.
         """
-        fw = Firewall()
+        fw = Firewall(hit_sample_rate=1, reorder_interval=2)
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80-90",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(fw_rule)
+        fw.accept_packet(
+            direction="inbound", protocol="tcp", port=85,
+            ip_address="192.168.1.2"
+        )
+        fw.remove_fw_rule(fw_rule)
+        fw.accept_packet(
+            direction="inbound", protocol="tcp", port=85,
+            ip_address="192.168.1.2"
+        )
+        self.assertEqual(fw.ordered_fw_rules["inbound"]["tcp"][0], ())
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=85,
+                ip_address="192.168.1.2"
+            )
+        )
+
+    def test_export_hit_counts(self):
+        """Verify that hit counts are exported to a CSV file."""
+        fw = Firewall(hit_sample_rate=1)
         fw.add_fw_rule(
             FirewallRule(
-                direction="inbound", protocol="tcp", port="80",
-                ip_address="192.168.1.2-192.168.2.1"
+                direction="inbound", protocol="tcp", port="80-90",
+                ip_address="192.168.1.2"
             )
         )
-        self.assertFalse(
-            fw.accept_packet(
-                direction="inbound", protocol="tcp", port=80,
-                ip_address="192.168.1.1"
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="outbound", protocol="udp", port="53",
+                ip_address="10.0.0.1"
             )
         )
-        self.assertFalse(
-            fw.accept_packet(
-                direction="inbound", protocol="tcp", port=91,
-                ip_address="192.168.2.2"
+        fw.accept_packet(
+            direction="inbound", protocol="tcp", port=85,
+            ip_address="192.168.1.2"
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            csv_file_path = os.path.join(temp_dir, "hit_counts.csv")
+            fw.export_hit_counts(csv_file_path)
+            with open(csv_file_path, "r") as csv_file:
+                rows = list(csv.reader(csv_file))
+        self.assertEqual(
+            rows, [
+                ["inbound", "tcp", "80-90", "192.168.1.2", "1"],
+                ["outbound", "udp", "53", "10.0.0.1", "0"],
+            ]
+        )
+
+
+    def test_get_ip_range(self):
+        """Verify that single, range, and CIDR IP addresses are parsed."""
+        ip = IPAddress("10.1.2.3").to_int()
+        self.assertEqual(get_ip_range("10.1.2.3"), (ip, ip))
+        self.assertEqual(
+            get_ip_range("10.1.2.3-10.1.2.9"),
+            (ip, IPAddress("10.1.2.9").to_int())
+        )
+        self.assertEqual(
+            get_ip_range("10.1.2.3/8"),
+            (
+                IPAddress("10.0.0.0").to_int(),
+                IPAddress("10.255.255.255").to_int()
             )
         )
+        self.assertEqual(get_ip_range("0.0.0.0/0"), (0, 0xFFFFFFFF))
 
+    def test_query_fw_rules(self):
+        """
+        Verify that a query returns each rule which overlaps its port values
+        and IP addresses once, and no other rules.
+        """
+        fw = Firewall()
+        fw_rules = [
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
+                ip_address="10.0.0.1"
+            ),
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="1-65535",
+                ip_address="10.20.0.0-10.20.255.255"
+            ),
+            FirewallRule(
+                direction="outbound", protocol="udp", port="20-30",
+                ip_address="9.0.0.0-10.0.0.0"
+            ),
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
+                ip_address="11.0.0.1"
+            ),
+            FirewallRule(
+                direction="inbound", protocol="udp", port="23-2000",
+                ip_address="10.0.0.1"
+            ),
+        ]
+        fw.add_fw_rules(fw_rules)
+        self.assertCountEqual(
+            fw.query_fw_rules("22", "10.0.0.0/8"), fw_rules[:3]
+        )
+        self.assertCountEqual(
+            fw.query_fw_rules("22", "10.0.0.0/8", direction="inbound"),
+            fw_rules[:2]
+        )
+        self.assertCountEqual(
+            fw.query_fw_rules(
+                "1000-5000", "10.0.0.1", direction="inbound", protocol="udp"
+            ),
+            fw_rules[4:]
+        )
+        self.assertCountEqual(
+            fw.query_fw_rules("1-65535", "0.0.0.0-255.255.255.255"), fw_rules
+        )
+        fw.remove_fw_rule(fw_rules[0])
+        self.assertCountEqual(
+            fw.query_fw_rules("22", "10.0.0.0/8"), fw_rules[1:3]
+        )
+
+    def test_remove_queried_rules(self):
+        """
+        Verify that the query results are streamed, and that rules can be
+        removed once the query results are collected in a list.
+        """
+        random.seed(0)
+        fw = Firewall()
+        fw.add_fw_rules(FirewallRule(*get_rand_rule()) for i in range(500))
+        fw_rules = fw.query_fw_rules("1-65535", "0.0.0.0/0")
+        self.assertIsInstance(next(fw_rules), FirewallRule)
+        for fw_rule in list(fw.query_fw_rules("1-65535", "0.0.0.0/0")):
+            fw.remove_fw_rule(fw_rule)
+        self.assertEqual(fw.get_fw_rules(), set())
+
+    def test_query_same_as_scan(self):
+        """
+        Verify that random queries return the same rules as checking every
+        rule.
+        """
+        random.seed(0)
+        fw = Firewall()
+        fw.add_fw_rules(FirewallRule(*get_rand_rule()) for i in range(500))
+        all_fw_rules = fw.get_fw_rules()
+        for i in range(50):
+            min_port = random.randint(1, 65535)
+            max_port = min(65535, min_port + random.choice((0, 100, 10000)))
+            prefix_len = random.choice((0, 1, 8, 24, 32))
+            ip_address = f"{random.randint(0, 255)}.0.0.0/{prefix_len}"
+            min_ip, max_ip = get_ip_range(ip_address)
+            fw_rules = list(
+                fw.query_fw_rules(f"{min_port}-{max_port}", ip_address)
+            )
+            self.assertEqual(len(fw_rules), len(set(fw_rules)))
+            self.assertEqual(
+                set(fw_rules), {
+                    fw_rule for fw_rule in all_fw_rules
+                    if fw_rule.min_port <= max_port and
+                    fw_rule.max_port >= min_port and
+                    fw_rule.min_ip.to_int() <= max_ip and
+                    fw_rule.max_ip.to_int() >= min_ip
+                }
+            )
+
+    def test_unpickled_rule_hash(self):
+        """
+        Verify that a rule pickled by another process, which hashes strings
+        differently, is found in a hash-set of the same rule.
+        """
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80-90",
+            ip_address="192.168.1.2"
+        )
+        hash(fw_rule)
+        code = (
+            "import pickle, sys\n"
+            "from firewall_rule import FirewallRule\n"
+            "fw_rule = FirewallRule(\n"
+            "    'inbound', 'tcp', '80-90', '192.168.1.2'\n"
+            ")\n"
+            "hash(fw_rule)\n"
+            "sys.stdout.buffer.write(pickle.dumps(fw_rule))\n"
+        )
+        pickled_fw_rule = subprocess.run(
+            [sys.executable, "-c", code], check=True, stdout=subprocess.PIPE,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=dict(os.environ, PYTHONHASHSEED="1")
+        ).stdout
+        unpickled_fw_rule = pickle.loads(pickled_fw_rule)
+        self.assertEqual(hash(unpickled_fw_rule), hash(fw_rule))
+        self.assertIn(unpickled_fw_rule, {fw_rule})
+        self.assertIn(fw_rule, {unpickled_fw_rule})
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,100 @@
+"""
+Unit tests to check functionality of hicuts_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_hicuts_firewall.py
+"""
+
+
+import unittest
+
+from firewall_rule import FirewallRule
+from hicuts_firewall import Firewall
+
+
+def get_leaves(node):
+    """Return all the leaves of the provided decision tree."""
+    if node.children is None:
+        return [node]
+    leaves = []
+    for child in node.children:
+        leaves.extend(get_leaves(child))
+    return leaves
+
+
+class TestHiCutsFirewall(unittest.TestCase):
+    def test_no_add_duplicate_rules(self):
+        """Verify that duplicate rules cannot be added."""
+        fw = Firewall()
+        for i in range(2):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="80",
+                    ip_address="192.168.1.2"
+                )
+            )
+        self.assertEqual(len(fw.fw_rules["inbound"]["tcp"].fw_rules), 1)
+
+    def test_leaf_size(self):
+        """Verify that leaves are cut once they store too many rules."""
+        fw = Firewall(leaf_size=4)
+        for port in range(1, 101):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port=str(port * 100),
+                    ip_address="192.168.1.2"
+                )
+            )
+        root = fw.fw_rules["inbound"]["tcp"]
+        self.assertIsNotNone(root.children)
+        for leaf in get_leaves(root):
+            self.assertLessEqual(len(leaf.fw_rules), 4)
+        for port in range(1, 101):
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=port * 100,
+                    ip_address="192.168.1.2"
+                )
+            )
+            self.assertFalse(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=port * 100 + 1,
+                    ip_address="192.168.1.2"
+                )
+            )
+
+    def test_covering_rule_not_cut(self):
+        """
+        Verify that a leaf is not cut when it stores a rule which covers its
+        entire region.
+        """
+        fw = Firewall(leaf_size=1)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="0-65535",
+                ip_address="0.0.0.0-255.255.255.255"
+            )
+        )
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="80",
+                ip_address="192.168.1.2"
+            )
+        )
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="81",
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertIsNone(fw.fw_rules["inbound"]["tcp"].children)
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=30000,
+                ip_address="1.2.3.4"
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,172 @@
+"""
+Unit tests to check functionality of layered_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_layered_firewall.py
+"""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from compiled_firewall import CompiledFirewall
+from firewall import Firewall
+from firewall_rule import FirewallRule
+from layered_firewall import LayeredFirewall, MultiTenantFirewall
+
+
+class TestLayeredFirewall(unittest.TestCase):
+    def test_firewall_allow_base_and_overlay_packets(self):
+        """
+        Verify firewall allows packets that match a rule of the base firewall
+        or a rule of the overlay.
+        """
+        base = Firewall("sample_rules.csv")
+        fw = LayeredFirewall(base=base)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
+                ip_address="10.0.0.1"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=22,
+                ip_address="10.0.0.1"
+            )
+        )
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=23,
+                ip_address="10.0.0.1"
+            )
+        )
+
+    def test_overlay_not_added_to_base(self):
+        """Verify that adding overlay rules does not change the base."""
+        base = Firewall()
+        fw = LayeredFirewall(base=base)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22-23",
+                ip_address="10.0.0.1-10.0.0.5"
+            )
+        )
+        self.assertIs(fw.base, base)
+        self.assertEqual(len(base.exact_fw_rules), 0)
+        bucket_num = 22 // base.num_ports_bucket
+        self.assertEqual(len(base.fw_rules["inbound"]["tcp"][bucket_num]), 0)
+        self.assertFalse(
+            base.accept_packet(
+                direction="inbound", protocol="tcp", port=22,
+                ip_address="10.0.0.1"
+            )
+        )
+
+    def test_base_cannot_count_hits(self):
+        """Verify that a base firewall which counts hits is not shared."""
+        with self.assertRaises(ValueError):
+            LayeredFirewall(base=Firewall(hit_sample_rate=1))
+
+    def test_base_is_frozen(self):
+        """Verify that the rules of a shared base cannot be changed."""
+        base = Firewall("sample_rules.csv")
+        fw = LayeredFirewall(base=base)
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80",
+            ip_address="192.168.1.2"
+        )
+        with self.assertRaises(RuntimeError):
+            base.add_fw_rule(fw_rule)
+        with self.assertRaises(RuntimeError):
+            base.add_fw_rules([fw_rule])
+        with self.assertRaises(RuntimeError):
+            base.remove_fw_rule(fw_rule)
+        with self.assertRaises(RuntimeError):
+            base.remove_expired_fw_rules()
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+
+    def test_overlay_from_csv(self):
+        """Verify that the overlay can be read from a CSV file."""
+        fw = LayeredFirewall("sample_rules.csv")
+        self.assertTrue(
+            fw.accept_packet(
+                direction="outbound", protocol="udp", port=1500,
+                ip_address="52.12.48.92"
+            )
+        )
+
+
+class TestMultiTenantFirewall(unittest.TestCase):
+    def setUp(self):
+        """
+        Copy the sample rules to a temporary directory, because the compiled
+        base firewall writes its cache file next to the CSV file.
+        """
+        self.temp_dir = tempfile.mkdtemp()
+        self.csv_file_path = os.path.join(self.temp_dir, "rules.csv")
+        shutil.copyfile("sample_rules.csv", self.csv_file_path)
+
+    def tearDown(self):
+        """Remove the temporary directory."""
+        shutil.rmtree(self.temp_dir)
+
+    def test_tenants_share_base(self):
+        """
+        Verify that all tenants share the same compiled base firewall.
+        """
+        fw = MultiTenantFirewall(self.csv_file_path)
+        self.assertIsInstance(fw.base, CompiledFirewall)
+        self.assertIsNotNone(fw.base.compiled_functions)
+        self.assertTrue(fw.base.frozen)
+        self.assertIs(fw.get_tenant_firewall("a").base, fw.base)
+        self.assertIs(fw.get_tenant_firewall("b").base, fw.base)
+        for tenant in ("a", "b", "unknown"):
+            self.assertTrue(
+                fw.accept_packet(
+                    tenant, direction="inbound", protocol="tcp", port=80,
+                    ip_address="192.168.1.2"
+                )
+            )
+
+    def test_tenant_rules_are_separate(self):
+        """Verify that a tenant's rules do not apply to other tenants."""
+        fw = MultiTenantFirewall(self.csv_file_path)
+        fw.add_fw_rule(
+            "a",
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="22",
+                ip_address="10.0.0.1"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                "a", direction="inbound", protocol="tcp", port=22,
+                ip_address="10.0.0.1"
+            )
+        )
+        for tenant in ("b", "unknown"):
+            self.assertFalse(
+                fw.accept_packet(
+                    tenant, direction="inbound", protocol="tcp", port=22,
+                    ip_address="10.0.0.1"
+                )
+            )
+        self.assertNotIn("unknown", fw.tenants)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+"""
+Unit tests to check functionality of sharded_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_sharded_firewall.py
+"""
+
+
+import sys
+import unittest
+from unittest import mock
+
+from firewall_rule import FirewallRule
+from sharded_firewall import ShardedFirewall, get_max_memory_kb
+
+
+class TestShardedFirewall(unittest.TestCase):
+    def test_partitions(self):
+        """
+        Verify that packets are owned by one shard, and that range rules are
+        sent to every shard which owns one of their ports.
+        """
+        with ShardedFirewall(num_shards=8) as fw:
+            self.assertEqual(fw.num_port_ranges, 2)
+            self.assertEqual(fw.get_shard("inbound", "tcp", 80), 0)
+            self.assertEqual(fw.get_shard("inbound", "tcp", 40000), 1)
+            self.assertEqual(fw.get_shard("outbound", "udp", 40000), 7)
+            self.assertEqual(
+                fw.get_shards("inbound", "udp", 80, 40000), {2, 3}
+            )
+            self.assertEqual(fw.get_shards("inbound", "udp", 80, 90), {2})
+
+    def test_firewall_allow_and_block_packets(self):
+        """
+        Verify firewall allows packets that match a rule, including a rule
+        which is split across shards, and blocks packets that don't.
+        """
+        with ShardedFirewall("sample_rules.csv", num_shards=3) as fw:
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="1-65535",
+                    ip_address="10.0.0.1"
+                )
+            )
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=80,
+                    ip_address="192.168.1.2"
+                )
+            )
+            self.assertTrue(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=65535,
+                    ip_address="10.0.0.1"
+                )
+            )
+            self.assertFalse(
+                fw.accept_packet(
+                    direction="inbound", protocol="tcp", port=81,
+                    ip_address="192.168.1.2"
+                )
+            )
+            self.assertEqual(
+                fw.accept_packets([
+                    ("outbound", "tcp", 15000, "192.168.10.11"),
+                    ("outbound", "tcp", 9999, "192.168.10.11"),
+                    ("inbound", "udp", 53, "192.168.1.200"),
+                    ("outbound", "udp", 1500, "52.12.48.92"),
+                ]),
+                [True, False, True, True]
+            )
+
+    def test_remove_rule(self):
+        """Verify that a removed rule is removed from every shard."""
+        with ShardedFirewall(num_shards=8) as fw:
+            fw_rule = FirewallRule(
+                direction="inbound", protocol="tcp", port="1-65535",
+                ip_address="10.0.0.1"
+            )
+            fw.add_fw_rule(fw_rule)
+            fw.remove_fw_rule(fw_rule)
+            self.assertEqual(
+                fw.accept_packets([
+                    ("inbound", "tcp", 1, "10.0.0.1"),
+                    ("inbound", "tcp", 65535, "10.0.0.1"),
+                ]),
+                [False, False]
+            )
+
+    def test_remove_expired_rules(self):
+        """Verify that expired rules are removed from every shard."""
+        with ShardedFirewall(num_shards=8) as fw:
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="1-65535",
+                    ip_address="10.0.0.1", expires_at=100
+                )
+            )
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="80",
+                    ip_address="10.0.0.2", expires_at=200
+                )
+            )
+            packets = [
+                ("inbound", "tcp", 1, "10.0.0.1"),
+                ("inbound", "tcp", 65535, "10.0.0.1"),
+                ("inbound", "tcp", 80, "10.0.0.2"),
+            ]
+            self.assertEqual(fw.remove_expired_fw_rules(now=50), 0)
+            self.assertEqual(fw.accept_packets(packets), [True, True, True])
+            self.assertEqual(fw.remove_expired_fw_rules(now=150), 2)
+            self.assertEqual(fw.accept_packets(packets), [False, False, True])
+            self.assertEqual(fw.remove_expired_fw_rules(now=250), 1)
+            self.assertEqual(
+                fw.accept_packets(packets), [False, False, False]
+            )
+
+    def test_shard_stats(self):
+        """Verify that each shard only stores its own rules."""
+        with ShardedFirewall("sample_rules.csv", num_shards=4) as fw:
+            shard_stats = fw.get_shard_stats()
+        self.assertEqual(
+            [stats["num_exact_fw_rules"] for stats in shard_stats],
+            [1, 0, 0, 0]
+        )
+        self.assertEqual(
+            [stats["num_bucket_entries"] for stats in shard_stats],
+            [0, 1, 11, 2]
+        )
+
+    def test_max_memory(self):
+        """
+        Verify that the max memory is reported in KB, and is `None` when the
+        `resource` module is not available.
+        """
+        max_memory = get_max_memory_kb()
+        self.assertIsInstance(max_memory, int)
+        # the test process uses more than 1 MB and less than 100 GB
+        self.assertGreater(max_memory, 1024)
+        self.assertLess(max_memory, 100 * 2 ** 20)
+        with mock.patch.dict(sys.modules, {"resource": None}):
+            self.assertIsNone(get_max_memory_kb())
+
+
+if __name__ == "__main__":
+    unittest.main()
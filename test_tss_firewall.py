@@ -0,0 +1,78 @@
+"""
+Unit tests to check functionality of tss_firewall.py.
+
+These unit tests can be run in the terminal using this command:
+    python3 test_tss_firewall.py
+"""
+
+
+import unittest
+
+from firewall_rule import FirewallRule
+from tss_firewall import Firewall, range_to_prefixes
+
+
+class TestTupleSpaceFirewall(unittest.TestCase):
+    def test_range_to_prefixes(self):
+        """Verify that ranges are expanded into the smallest prefixes."""
+        self.assertEqual(
+            range_to_prefixes(80, 90, 16), [(80, 13), (88, 15), (90, 16)]
+        )
+        self.assertEqual(range_to_prefixes(80, 80, 16), [(80, 16)])
+        self.assertEqual(range_to_prefixes(0, 65535, 16), [(0, 0)])
+        self.assertEqual(
+            range_to_prefixes(1, 65535, 16),
+            [(1 << i, 16 - i) for i in range(16)]
+        )
+
+    def test_no_add_duplicate_rules(self):
+        """Verify that duplicate rules cannot be added."""
+        fw = Firewall()
+        for i in range(2):
+            fw.add_fw_rule(
+                FirewallRule(
+                    direction="inbound", protocol="tcp", port="80",
+                    ip_address="192.168.1.2"
+                )
+            )
+        tuple_space = fw.fw_rules["inbound"]["tcp"]
+        self.assertEqual(list(tuple_space), [(16, 32)])
+        self.assertEqual(len(tuple_space[(16, 32)]), 1)
+        for fw_rules in tuple_space[(16, 32)].values():
+            self.assertEqual(len(fw_rules), 1)
+
+    def test_remove_rule(self):
+        """
+        Verify that removing a rule only blocks the packets that no other rule
+        matches, and that empty groups are removed.
+        """
+        fw = Firewall()
+        fw_rule = FirewallRule(
+            direction="inbound", protocol="tcp", port="80-90",
+            ip_address="192.168.1.2"
+        )
+        fw.add_fw_rule(fw_rule)
+        fw.add_fw_rule(
+            FirewallRule(
+                direction="inbound", protocol="tcp", port="88-89",
+                ip_address="192.168.1.2"
+            )
+        )
+        fw.remove_fw_rule(fw_rule)
+        self.assertFalse(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=80,
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertTrue(
+            fw.accept_packet(
+                direction="inbound", protocol="tcp", port=88,
+                ip_address="192.168.1.2"
+            )
+        )
+        self.assertEqual(list(fw.fw_rules["inbound"]["tcp"]), [(15, 32)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+This file implements a firewall which stores firewall rules in the style of
+tuple space search.
+
+This program can be run in the terminal using this command:
+    python3 tss_firewall.py
+
+The rules of `500k_rules.csv` have wide random ranges, which expand into too
+many prefix pairs to fit in memory. So the program only reads the first
+`MAX_FW_RULES` rules of the file.
+"""
+
+
+import time
+from typing import List, Optional, Tuple
+
+from engine import FirewallEngine
+from firewall_rule import FirewallRule
+from ip_address import IPAddress
+
+
+# the number of bits in a port value and in an IP address
+PORT_BITS = 16
+IP_BITS = 32
+
+# the masks which keep the first N bits of a port value or IP address
+PORT_MASKS = [
+    ((1 << PORT_BITS) - 1) ^ ((1 << (PORT_BITS - i)) - 1)
+    for i in range(PORT_BITS + 1)
+]
+IP_MASKS = [
+    ((1 << IP_BITS) - 1) ^ ((1 << (IP_BITS - i)) - 1)
+    for i in range(IP_BITS + 1)
+]
+
+# the max number of firewall rules of a generated CSV file which fit in
+# memory, which is about 160MB for 5000 rules of `500k_rules.csv`
+MAX_FW_RULES = 5000
+
+
+def range_to_prefixes(
+    min_value: int, max_value: int, num_bits: int
+) -> List[Tuple[int, int]]:
+    """
+    Return the smallest list of prefixes which cover exactly the values
+    between the provided min and max values. Each prefix is a tuple of: the
+    masked value and the prefix length.
+
+    For example, the 16-bit port range 80-90 is covered by the prefixes:
+    [(80, 13), (88, 15), (90, 16)].
+    """
+    prefixes = []
+    while min_value <= max_value:
+        # find the largest aligned block which starts at the min value
+        block_size = min_value & -min_value if min_value else 1 << num_bits
+        while block_size > max_value - min_value + 1:
+            block_size >>= 1
+        prefix_length = num_bits - block_size.bit_length() + 1
+        prefixes.append((min_value, prefix_length))
+        min_value += block_size
+    return prefixes
+
+
+class Firewall(FirewallEngine):
+    """
+    A data structure to represent a firewall. A firewall contains a list of
+    firewall rules.
+
+    There are four possible combinations of direction and protocol values.
+    Each combination stores its firewall rules in a tuple space.
+
+    The port range and the IP address range of each firewall rule are
+    expanded into prefixes. For example, port range 80-90 is expanded into
+    the prefixes 80/13, 88/15, and 90/16. A firewall rule is stored once for
+    every pair of its port prefixes and IP address prefixes.
+
+    The pairs are grouped by their (port prefix length, IP address prefix
+    length) tuple. Each group is a hash-map whose keys are the masked
+    (port, IP address) values. Every key maps to a hash-set of the firewall
+    rules which expanded into it.
+
+    Deciding to accept a packet masks the packet's port value and IP address
+    with each group's prefix lengths, and probes the group's hash-map. There
+    are at most 17 * 33 groups, so the time to accept a packet does not depend
+    on the number of firewall rules. Adding and removing a firewall rule are
+    hash-map operations for each of its prefix pairs.
+
+    A firewall rule with wide port and IP address ranges can expand into
+    hundreds of prefix pairs, so this firewall is best suited to rules which
+    are mostly single values or prefix-aligned ranges.
+    """
+
+    max_fw_rules = MAX_FW_RULES
+
+    def __init__(self, csv_file_path: Optional[str] = None):
+        """
+        Initialize the firewall by reading and storing the firewall rules of
+        the CSV file.
+        """
+        self.fw_rules = {
+            "inbound": {"tcp": {}, "udp": {}},
+            "outbound": {"tcp": {}, "udp": {}},
+        }
+
+        # read firewall rules from CSV file and add them to the data structure
+        super().__init__(csv_file_path)
+
+    def get_prefix_pairs(
+        self, fw_rule: FirewallRule
+    ) -> List[Tuple[Tuple[int, int], Tuple[int, int]]]:
+        """
+        Return the prefix pairs of the provided firewall rule. Each pair is a
+        tuple of: the (port prefix length, IP address prefix length) tuple,
+        and the masked (port, IP address) key.
+        """
+        port_prefixes = range_to_prefixes(
+            fw_rule.min_port, fw_rule.max_port, PORT_BITS
+        )
+        ip_prefixes = range_to_prefixes(
+            fw_rule.min_ip.to_int(), fw_rule.max_ip.to_int(), IP_BITS
+        )
+        return [
+            ((port_length, ip_length), (port, ip))
+            for port, port_length in port_prefixes
+            for ip, ip_length in ip_prefixes
+        ]
+
+    def add_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """Add the provided firewall rule to the data structure."""
+        tuple_space = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        for prefix_lengths, key in self.get_prefix_pairs(fw_rule):
+            group = tuple_space.setdefault(prefix_lengths, {})
+            group.setdefault(key, set()).add(fw_rule)
+
+    def remove_fw_rule(self, fw_rule: FirewallRule) -> None:
+        """
+        Remove the provided firewall rule from the data structure. Nothing is
+        removed if the firewall rule was not added.
+        """
+        tuple_space = self.fw_rules[fw_rule.direction][fw_rule.protocol]
+        for prefix_lengths, key in self.get_prefix_pairs(fw_rule):
+            group = tuple_space.get(prefix_lengths)
+            if group is None or key not in group:
+                continue
+            group[key].discard(fw_rule)
+            if not group[key]:
+                del group[key]
+                if not group:
+                    del tuple_space[prefix_lengths]
+
+    def accept_packet(
+        self, direction: str, protocol: str, port: int, ip_address: str
+    ) -> bool:
+        """
+        Determine whether the firewall can accept the packet with its rules.
+        """
+        ip = IPAddress(ip_address).to_int()
+        tuple_space = self.fw_rules[direction][protocol]
+        for (port_length, ip_length), group in tuple_space.items():
+            key = (port & PORT_MASKS[port_length], ip & IP_MASKS[ip_length])
+            if key in group:
+                return True
+        return False
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    fw = Firewall()
+    fw.load_csv("500k_rules.csv", MAX_FW_RULES)
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Tuple space firewall time duration to add rules: {duration}")
+
+    start_time = time.time()
+    print(fw.accept_packet("inbound", "tcp", 80, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "udp", 53, "192.168.2.1"))
+    print(fw.accept_packet("inbound", "tcp", 81, "192.168.1.2"))
+    print(fw.accept_packet("inbound", "udp", 24, "52.12.48.92"))
+    end_time = time.time()
+    duration = end_time - start_time
+    print(f"Tuple space firewall time duration to accept packets: {duration}")